@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CusUserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'custom_user'
+
+    def ready(self):
+        import custom_user.signals  # noqa: F401
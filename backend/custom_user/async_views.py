@@ -0,0 +1,39 @@
+"""Async subscribe toggle, routed when ``ASYNC_TOGGLES`` is on."""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from rest_framework import exceptions
+
+from custom_user.serializers import UserSubscriptionSerializer
+from custom_user.views import add_subscription, remove_subscription
+from main.async_api import async_api_view, drf_request, respond
+
+User = get_user_model()
+
+
+@sync_to_async
+def represent(user, request):
+    # Reads the author's recipes and the viewer's subscriptions.
+    return UserSubscriptionSerializer(user, context={'request': drf_request(request)}).data
+
+
+@async_api_view(['post', 'delete'])
+async def subscribe(request, id=None):
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+    if request.method == 'POST':
+        target_user = await aget_object_or_404(User, pk=id)
+        if request.user == target_user:
+            return respond(status=400)
+        if not await sync_to_async(add_subscription)(request.user, target_user):
+            return respond(status=400)
+        await target_user.arefresh_from_db(fields=['subscribers_count'])
+        return respond(await represent(target_user, request), status=201)
+
+    if not await User.objects.filter(pk=id).aexists():
+        raise Http404(f'No {User._meta.object_name} matches the given query.')
+    if not await sync_to_async(remove_subscription)(request.user, id):
+        return respond(status=400)
+    return respond(status=204)
@@ -0,0 +1,24 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    CustomUser = apps.get_model('custom_user', 'CustomUser')
+    CustomUser.objects.update(updated_at=models.F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_user', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
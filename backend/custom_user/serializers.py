@@ -3,11 +3,19 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer
 from rest_framework.validators import UniqueValidator
 
-from relations.serializers import ShortRecipeSerializer
+from relations.serializers import SHORT_RECIPE_FIELDS, ShortRecipeSerializer
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
 class UserCCreateSerializer(UserCreateSerializer):
     email = serializers.EmailField(
         required=True,
@@ -39,13 +47,19 @@ class BaseUserSerializer(serializers.ModelSerializer):
             'last_name',
             'avatar',
             'username',
-            'is_subscribed'
+            'is_subscribed',
+            'subscribers_count',
+            'recipes_count'
         )
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return (user.is_authenticated and
-                user.from_sender.filter(to=obj).exists())
+        if not user.is_authenticated:
+            return False
+        subscriptions = self.context.get('subscriptions')
+        if subscriptions is not None:
+            return obj.id in subscriptions
+        return user.from_sender.filter(to=obj).exists()
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -56,20 +70,16 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 class UserSubscriptionSerializer(BaseUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count', read_only=True)
 
     class Meta(BaseUserSerializer.Meta):
-        fields = BaseUserSerializer.Meta.fields + ('recipes', 'recipes_count')
+        fields = BaseUserSerializer.Meta.fields + ('recipes',)
 
     def get_recipes(self, user):
-        queryset = user.recipes.all()
-        limit = self._get_recipes_limit()
-        if limit:
-            queryset = queryset[:limit]
+        if hasattr(user, 'limited_recipes'):
+            queryset = user.limited_recipes
+        else:
+            queryset = user.recipes.only(*SHORT_RECIPE_FIELDS)
+            limit = get_recipes_limit(self.context['request'])
+            if limit:
+                queryset = queryset[:limit]
         return ShortRecipeSerializer(queryset, many=True, context=self.context).data
-
-    def _get_recipes_limit(self):
-        try:
-            return int(self.context['request'].query_params.get('recipes_limit'))
-        except Exception:
-            return None
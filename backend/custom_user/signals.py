@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ingredients_recipe.snapshots import AUTHOR_FIELDS
+from main.response_cache import invalidate
+from main.storage import image_names, release_on_commit
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which no response exposes.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate('recipes', f'user:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def expire_recipe_snapshots(sender, instance, created=False, update_fields=None, **kwargs):
+    # The author's profile is part of their recipes' snapshots.
+    if created or update_fields and not set(update_fields) & set(AUTHOR_FIELDS):
+        return
+    instance.recipes.update(updated_at=timezone.now(), snapshot='')
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    release_on_commit(*image_names(instance, 'avatar'))
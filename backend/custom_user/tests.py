@@ -0,0 +1,47 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from custom_user.models import Subscription
+from main.testing import create_recipes, create_user, token_header
+
+
+class SubscriptionsQueriesTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.authors = [create_user(f'author{i}') for i in range(6)]
+        for i, author in enumerate(self.authors):
+            create_recipes(author, i + 2)
+            Subscription.objects.create(from_source=self.user, to=author)
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_recipes_limit_and_count(self):
+        response, _ = self._get(limit=10, recipes_limit=2)
+
+        self.assertEqual(response.data['count'], len(self.authors))
+        for item, author in zip(response.data['results'], self.authors):
+            self.assertEqual(item['id'], author.id)
+            self.assertTrue(item['is_subscribed'])
+            self.assertEqual(item['recipes_count'], author.recipes.count())
+            self.assertEqual(len(item['recipes']), 2)
+
+    def test_queries_do_not_grow(self):
+        _, small = self._get(limit=1, recipes_limit=1)
+        _, large = self._get(limit=6, recipes_limit=5)
+        _, unlimited = self._get(limit=6)
+        self.assertEqual(small, large)
+        self.assertEqual(small, unlimited)
+
+    def test_recipes_skip_snapshots(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/users/subscriptions/', {'recipes_limit': 1})
+            self.client.post(f'/api/users/{create_user("writer").id}/subscribe/')
+
+        self.assertFalse([q for q in context.captured_queries if '"snapshot"' in q['sql']])
@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 from .views import AvatarRetrieveUpdateDestroyAPIView, CustomUserViewSet
 
 router = DefaultRouter()
@@ -13,3 +14,7 @@ urlpatterns = [
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/users/me/avatar/', AvatarRetrieveUpdateDestroyAPIView.as_view(), name='user-avatar'),
 ]
+
+if settings.ASYNC_TOGGLES:
+    # Matched before the router's users-subscribe route.
+    urlpatterns.insert(0, path('api/users/<int:id>/subscribe/', async_views.subscribe))
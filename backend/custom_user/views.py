@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from rest_framework.views import APIView
 from djoser.views import UserViewSet
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
@@ -7,30 +9,71 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.pagination import LimitOffsetPagination
-from django.core.files.base import ContentFile
-import base64
-import uuid
 from django.shortcuts import get_object_or_404
 
 from custom_user.models import Subscription
-from custom_user.serializers import AvatarSerializer, BaseUserSerializer, UserSubscriptionSerializer
+from custom_user.serializers import (AvatarSerializer, BaseUserSerializer, UserSubscriptionSerializer,
+                                     get_recipes_limit)
+from ingredients_recipe.models import Recipe
 from ingredients_recipe.permissions import IsAuthorOrReadOnly
+from main.images import decode_image, schedule
+from main.profiling import ProfiledViewMixin, serialize
+from main.storage import image_names, release_on_commit
+from main.response_cache import CachedResponseMixin
+from relations.counters import increment
+from relations.serializers import SHORT_RECIPE_FIELDS
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+def add_subscription(user, target_user):
+    """Subscribe and update the counter atomically; False if already subscribed."""
+    try:
+        with transaction.atomic():
+            Subscription.objects.create(from_source=user, to=target_user)
+            increment(User, target_user.pk, 'subscribers_count')
+    except IntegrityError:
+        return False
+    return True
+
+
+def remove_subscription(user, user_id):
+    """Unsubscribe and update the counter atomically; return the rows deleted."""
+    with transaction.atomic():
+        deleted = user.from_sender.filter(to_id=user_id).delete()[0]
+        if deleted:
+            increment(User, user_id, 'subscribers_count', -deleted)
+    return deleted
+
+
+class CustomUserViewSet(CachedResponseMixin, ProfiledViewMixin, UserViewSet):
     pagination_class = LimitOffsetPagination
+    cached_actions = ('retrieve',)
+
+    def get_cache_tags(self, response):
+        return [f'user:{response.data["id"]}']
 
     @action(detail=False, methods=['get'], url_path='subscriptions')
     def subscriptions(self, request):
-        insts = [sub.to for sub in request.user.from_sender.select_related('to')]
-        page = self.paginate_queryset(insts)
-        if page:
-            serializer = UserSubscriptionSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        serializer = UserSubscriptionSerializer(insts, many=True, context={'request': request})
-        return Response(serializer.data)
+        recipes = Recipe.objects.only(*SHORT_RECIPE_FIELDS)
+        limit = get_recipes_limit(request)
+        if limit:
+            recipes = recipes[:limit]
+        authors = User.objects.filter(
+            to_sender__from_source=request.user
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('to_sender__id')
+        page = self.paginate_queryset(authors)
+        if page is None:
+            return Response(self._serialize_subscriptions(request, authors))
+        return self.get_paginated_response(self._serialize_subscriptions(request, page))
+
+    def _serialize_subscriptions(self, request, authors):
+        return serialize(UserSubscriptionSerializer(authors, many=True, context={
+            'request': request,
+            'subscriptions': {author.id for author in authors},
+        }))
 
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe', permission_classes=[IsAuthorOrReadOnly])
     def subscribe(self, request, id=None):
@@ -40,21 +83,17 @@ class CustomUserViewSet(UserViewSet):
 
     def _create(self, request, user_id):
         target_user = get_object_or_404(User, pk=user_id)
-        if request.user == target_user:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        inst, created = Subscription.objects.get_or_create(from_source=request.user, to=target_user)
-        if not created:
+        if request.user == target_user or not add_subscription(request.user, target_user):
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        target_user.refresh_from_db(fields=['subscribers_count'])
         return Response(
-            UserSubscriptionSerializer(target_user, context={'request': request}).data,
+            serialize(UserSubscriptionSerializer(target_user, context={'request': request})),
             status=status.HTTP_201_CREATED)
 
     def _remove(self, request, user_id):
-        subscription = request.user.from_sender.filter(to_id=user_id)
         get_object_or_404(User, pk=user_id)
-        if not subscription.exists():
+        if not remove_subscription(request.user, user_id):
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -63,7 +102,7 @@ class AvatarRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def retrieve(self, request, *args, **kwargs):
-        return Response(self.get_serializer(self._get_user()).data)
+        return Response(serialize(self.get_serializer(self._get_user())))
 
     def update(self, request, *args, **kwargs):
         avatar = request.data.get('avatar')
@@ -76,20 +115,24 @@ class AvatarRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
             return Response({'avatar': None})
 
     def destroy(self, request, *args, **kwargs):
+        # The image worker may have replaced the file since the user was loaded.
+        request.user.refresh_from_db(fields=['avatar'])
         if not request.user.avatar:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        request.user.avatar.delete()
+        old_images = image_names(request.user, 'avatar')
+        request.user.avatar = None
         request.user.save()
+        release_on_commit(*old_images)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def _convert(self, user, avatar_data):
-        format, imgstr = avatar_data.split(';base64,')
-        ext = format.split('/')[-1]
-        user.avatar.save(
-            f'{uuid.uuid4()}.{ext}',
-            ContentFile(base64.b64decode(imgstr))
-        )
+        avatar = decode_image(avatar_data)
+        user.refresh_from_db(fields=['avatar'])
+        old_images = image_names(user, 'avatar')
+        user.avatar.save(avatar.name, avatar)
         user.save()
+        release_on_commit(*old_images - image_names(user, 'avatar'))
+        schedule(user, 'avatar')
 
     def _get_user(self):
         return self.request.user
@@ -99,4 +142,4 @@ class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        return Response(BaseUserSerializer(request.user, context={'request': request}).data)
+        return Response(serialize(BaseUserSerializer(request.user, context={'request': request})))
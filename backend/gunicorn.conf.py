@@ -0,0 +1,28 @@
+"""Gunicorn settings for the production entrypoint, driven by the environment."""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+
+# Response cache tags, profiling and the catalogue version live in the
+# Django cache: workers only see each other's writes through a shared one.
+shared_cache = os.getenv('CACHE_BACKEND', 'locmem') != 'locmem'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1 if shared_cache else 1))
+if workers > 1 and not shared_cache:
+    raise RuntimeError(f'WEB_CONCURRENCY={workers} needs CACHE_BACKEND=redis or file, not locmem.')
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'main.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'main.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+# Recycle workers now and then to bound memory growth.
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
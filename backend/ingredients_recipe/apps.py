@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ContentConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ingredients_recipe"
+
+    def ready(self):
+        import ingredients_recipe.signals  # noqa: F401
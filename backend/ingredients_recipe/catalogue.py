@@ -0,0 +1,45 @@
+from ingredients_recipe.models import Ingredient
+from main.response_cache import get_tag_versions
+
+TAG = 'ingredients'
+
+_catalogue = None
+
+
+class Catalogue:
+    """Snapshot of the whole ingredient table for one catalogue version."""
+
+    def __init__(self, version, ingredients):
+        self.version = version
+        self.ingredients = ingredients
+        self.by_id = {ingredient.id: ingredient for ingredient in ingredients}
+        self.data = [
+            {
+                'id': ingredient.id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+            } for ingredient in ingredients
+        ]
+
+
+def get_version():
+    """Version of the ingredients cache tag, bumped on commit of every ingredient write."""
+    return get_tag_versions([TAG])[TAG]
+
+
+def get_catalogue(version=None):
+    global _catalogue
+    version = version or get_version()
+    if _catalogue is None or _catalogue.version != version:
+        _catalogue = Catalogue(version, list(Ingredient.objects.all()))
+    return _catalogue
+
+
+def get_ingredients(ids):
+    """Map ids to ingredients from memory, with one bulk query for misses."""
+    by_id = get_catalogue().by_id
+    found = {pk: by_id[pk] for pk in ids if pk in by_id}
+    missing = set(ids) - found.keys()
+    if missing:
+        found.update(Ingredient.objects.in_bulk(missing))
+    return found
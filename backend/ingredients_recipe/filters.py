@@ -1,12 +1,16 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 
+from ingredients_recipe.fulltext import search_recipes
 from ingredients_recipe.models import Recipe
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
 
 
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.NumberFilter(field_name='author__id')
     is_favorited = django_filters.NumberFilter(method='filter_favorite')
     is_in_shopping_cart = django_filters.NumberFilter(method='filter_shopping_cart')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -14,10 +18,15 @@ class RecipeFilter(django_filters.FilterSet):
 
     def filter_favorite(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(FavoriteUserRecipe.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
 
     def filter_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart_recipe__user=self.request.user)
+            return queryset.filter(Exists(ShoppingCartUserRecipe.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
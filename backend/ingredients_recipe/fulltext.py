@@ -0,0 +1,219 @@
+"""Full-text recipe search over names, ingredient names and texts."""
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Exists, F, FloatField, Func, OuterRef, Q
+
+from ingredients_recipe.models import RecipeIngredient, RecipeSearch
+
+VENDORS = ('sqlite', 'postgresql')
+
+WORD = re.compile(r'\w+')
+MAX_TERMS = 8
+
+BATCH_SIZE = 500
+
+# bm25 weights of the name, ingredients and text columns.
+FTS5_WEIGHTS = (10.0, 4.0, 1.0)
+
+CREATE_SQL = {
+    'sqlite': [
+        """
+        CREATE VIRTUAL TABLE ingredients_recipe_recipesearch USING fts5(
+            name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+    ],
+    'postgresql': [
+        """
+        CREATE TABLE ingredients_recipe_recipesearch (
+            rowid bigint PRIMARY KEY,
+            document tsvector NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX recipe_search_document_idx
+        ON ingredients_recipe_recipesearch USING gin (document)
+        """,
+    ],
+}
+
+INGREDIENTS_SQL = {
+    'sqlite': """(
+        SELECT group_concat(ingredient.name, ' ')
+        FROM ingredients_recipe_recipeingredient item
+        JOIN ingredients_recipe_ingredient ingredient ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    )""",
+    'postgresql': """(
+        SELECT string_agg(ingredient.name, ' ')
+        FROM ingredients_recipe_recipeingredient item
+        JOIN ingredients_recipe_ingredient ingredient ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    )""",
+}
+
+INSERT_SQL = {
+    'sqlite': """
+        INSERT INTO ingredients_recipe_recipesearch (rowid, name, ingredients, text)
+        SELECT recipe.id, recipe.name, COALESCE({ingredients}, ''), recipe.text
+        FROM ingredients_recipe_recipe recipe
+    """,
+    'postgresql': """
+        INSERT INTO ingredients_recipe_recipesearch (rowid, document)
+        SELECT recipe.id,
+            setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A')
+            || setweight(to_tsvector(%(config)s::regconfig, COALESCE({ingredients}, '')), 'B')
+            || setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+        FROM ingredients_recipe_recipe recipe
+    """,
+}
+
+_pending = threading.local()
+
+
+def has_index(vendor=None):
+    return (vendor or connection.vendor) in VENDORS
+
+
+def use_index():
+    backend = settings.RECIPE_SEARCH_BACKEND
+    if backend == 'auto':
+        return has_index()
+    return backend == 'fulltext'
+
+
+def create_table(schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_table(schema_editor):
+    if has_index(schema_editor.connection.vendor):
+        schema_editor.execute('DROP TABLE IF EXISTS ingredients_recipe_recipesearch')
+
+
+def _write(cursor, vendor, pks=None):
+    """Replace the index rows of ``pks``, of every recipe when ``None``."""
+    params = {'config': settings.RECIPE_SEARCH_CONFIG}
+    sql = INSERT_SQL[vendor].format(ingredients=INGREDIENTS_SQL[vendor])
+    if pks is None:
+        cursor.execute('DELETE FROM ingredients_recipe_recipesearch')
+    else:
+        placeholders = ', '.join(f'%(pk{index})s' for index in range(len(pks)))
+        params.update((f'pk{index}', pk) for index, pk in enumerate(pks))
+        cursor.execute(f'DELETE FROM ingredients_recipe_recipesearch WHERE rowid IN ({placeholders})', params)
+        sql += f' WHERE recipe.id IN ({placeholders})'
+    cursor.execute(sql, params)
+
+
+def reindex(pks):
+    """Rewrite the index rows of recipes ``pks``; ids of deleted recipes drop theirs."""
+    if not has_index():
+        return
+    pks = sorted(pks)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            _write(cursor, connection.vendor, pks[start:start + BATCH_SIZE])
+
+
+def rebuild():
+    """Rewrite the whole index from the recipe tables."""
+    if not has_index():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        _write(cursor, connection.vendor)
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                'INSERT INTO ingredients_recipe_recipesearch (ingredients_recipe_recipesearch) '
+                "VALUES ('optimize')"
+            )
+
+
+def reindex_on_commit(*pks):
+    """Reindex ``pks`` once the current transaction commits."""
+    if not pks:
+        return
+    _pending.__dict__.setdefault('pks', set()).update(pks)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    pks = _pending.__dict__.pop('pks', None)
+    if pks:
+        reindex(pks)
+
+
+def get_terms(query):
+    return WORD.findall(query.casefold())[:MAX_TERMS]
+
+
+class SearchExpression(Func):
+    """SQL over the ``RecipeSearch`` row joined to the recipe."""
+
+    def __init__(self, terms, **extra):
+        super().__init__(F('search_entry__document'), **extra)
+        self.terms = terms
+
+    def _table(self, compiler, connection):
+        # FTS5 functions and MATCH take the hidden column named after the table.
+        alias = compiler.quote_name_unless_alias(self.get_source_expressions()[0].alias)
+        return f'{alias}.{connection.ops.quote_name(RecipeSearch._meta.db_table)}'
+
+    def _tsquery(self, compiler, connection):
+        document, params = compiler.compile(self.get_source_expressions()[0])
+        tsquery = ' & '.join(f'{term}:*' for term in self.terms)
+        return document, 'to_tsquery(%s::regconfig, %s)', [*params, settings.RECIPE_SEARCH_CONFIG, tsquery]
+
+
+class Match(SearchExpression):
+    output_field = BooleanField()
+    conditional = True
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        query = ' '.join(f'"{term}"*' for term in self.terms)
+        return f'{self._table(compiler, connection)} MATCH %s', [query]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, tsquery, params = self._tsquery(compiler, connection)
+        return f'{document} @@ {tsquery}', params
+
+
+class Rank(SearchExpression):
+    """Relevance of the match, higher is better."""
+
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        weights = ', '.join(map(str, FTS5_WEIGHTS))
+        return f'-bm25({self._table(compiler, connection)}, {weights})', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, tsquery, params = self._tsquery(compiler, connection)
+        return f'ts_rank({document}, {tsquery})', params
+
+
+def naive_search(queryset, terms):
+    """Recipes containing every term in the name, text or an ingredient name, unranked."""
+    for term in terms:
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(text__icontains=term) | Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__name__icontains=term
+            ))
+        )
+    return queryset
+
+
+def search_recipes(queryset, query):
+    """Recipes of ``queryset`` matching every word of ``query``, most relevant first."""
+    terms = get_terms(query)
+    if not terms:
+        return queryset
+    if not use_index():
+        return naive_search(queryset, terms)
+    # The lookup on the entry makes the join an inner one, which MATCH needs.
+    return queryset.filter(Match(terms), search_entry__isnull=False).annotate(
+        search_rank=Rank(terms)
+    ).order_by('-search_rank', '-pub_date', '-id')
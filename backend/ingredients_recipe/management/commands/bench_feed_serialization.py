@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer, ModelSerializer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from custom_user.models import Subscription
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient
+from ingredients_recipe.serializers import RecipeListSerializer
+from ingredients_recipe.snapshots import fill
+from ingredients_recipe.views import RecipeViewSet
+from main.bench import describe, measure, rolled_back
+from main.renderers import FastJSONRenderer, orjson
+
+User = get_user_model()
+
+
+class DRFRecipeSerializer(RecipeListSerializer):
+    """The declared fields walked by DRF, without snapshots."""
+
+    to_representation = ModelSerializer.to_representation
+
+
+class Command(BaseCommand):
+    help = 'Time serialization and rendering of one feed page: DRF serializers vs stored snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=8, help='Per seeded recipe.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(**options)
+
+    def _run(self, page_size, ingredients, repeat, **options):
+        viewer = User.objects.create(username='bench-feed-viewer', email='bench-feed-viewer@example.com')
+        missing = page_size - Recipe.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} temporary recipes...')
+            authors = User.objects.bulk_create([
+                User(username=f'bench-feed-{i}', email=f'bench-feed-{i}@example.com') for i in range(10)
+            ])
+            pantry = list(Ingredient.objects.all()[:ingredients]) or Ingredient.objects.bulk_create([
+                Ingredient(name=f'bench {i}', measurement_unit='г') for i in range(ingredients)
+            ])
+            recipes = Recipe.objects.bulk_create([
+                Recipe(author=authors[i % len(authors)], name=f'Bench {i}', image='bench.png',
+                       text='text ' * 50, cooking_time=10)
+                for i in range(missing)
+            ])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+                for recipe in recipes for ingredient in pantry
+            ])
+            Subscription.objects.create(from_source=viewer, to=authors[0])
+
+        request = APIRequestFactory().get('/api/recipes/', {'limit': page_size})
+        force_authenticate(request, viewer)
+        view = RecipeViewSet(action_map={'get': 'list'}, format_kwarg=None, kwargs={})
+        view.request = view.initialize_request(request)
+        queryset = view.get_queryset()
+        full = list(queryset.defer(None).prefetch_related('recipe_ingredients__ingredient')[:page_size])
+        recipes = list(queryset[:page_size])
+        context = view.get_serializer_context()
+        context['subscriptions'] = view._get_subscriptions(recipes)
+
+        def drf():
+            return ListSerializer(full, child=DRFRecipeSerializer(), context=context).data
+
+        def snapshots():
+            return RecipeListSerializer(recipes, many=True, context=context).data
+
+        def cold():
+            for recipe in recipes:
+                recipe.snapshot = ''
+            fill(recipes)
+
+        data = drf()
+        with CaptureQueriesContext(connection) as queries:
+            snapshot_data = snapshots()
+        assert JSONRenderer().render(data) == JSONRenderer().render(snapshot_data), 'feed payloads differ'
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data), 'renderers differ'
+
+        self.stdout.write(
+            f'{len(recipes)} recipes, {sum(len(item["ingredients"]) for item in data)} ingredient rows, '
+            f'{len(queries.captured_queries)} queries while serializing and building snapshots; '
+            f'orjson {"available" if orjson else "not installed"}:'
+        )
+        self._report('DRF serializers', drf, repeat)
+        self._report('snapshots', snapshots, repeat)
+        self._report('building snapshots', cold, repeat)
+        self._report('JSONRenderer', lambda: JSONRenderer().render(data), repeat)
+        self._report('FastJSONRenderer', lambda: FastJSONRenderer().render(data), repeat)
+
+    def _report(self, label, function, repeat):
+        self.stdout.write(f'{label:>18}: {describe(measure(function, [()] * repeat))} per page')
@@ -0,0 +1,45 @@
+import base64
+import io
+import os
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from main.images import decode_image
+
+
+def split_decode(data):
+    """The previous approach: split the data URI and decode it in one go."""
+    format_, imgstr = data.split(';base64,')
+    return ContentFile(base64.b64decode(imgstr), name=f'upload.{format_.split("/")[-1]}')
+
+
+class Command(BaseCommand):
+    help = 'Compare peak Python memory of decoding a base64 image upload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megabytes', type=float, default=7.0, help='Size of the decoded image.')
+
+    def handle(self, *args, **options):
+        side = int((options['megabytes'] * 1024 * 1024 / 3) ** 0.5)
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+            buffer, 'PNG', compress_level=0
+        )
+        data = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        del buffer
+        self.stdout.write(
+            f'payload {len(data) / 1024 / 1024:.1f} MB, image {side}x{side}'
+        )
+        for label, decode in (('split', split_decode), ('streaming', decode_image)):
+            tracemalloc.start()
+            started = time.perf_counter()
+            file = decode(data)
+            elapsed = (time.perf_counter() - started) * 1000
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            file.close()
+            self.stdout.write(f'{label:>10}: peak {peak / 1024 / 1024:.1f} MB, {elapsed:.0f} ms')
@@ -0,0 +1,42 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from ingredients_recipe.models import Ingredient
+from ingredients_recipe.search import search_ingredients
+from main.bench import describe, measure
+
+
+class Command(BaseCommand):
+    help = 'Compare ingredient autocomplete latency: icontains vs the search engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Ingredient catalogue is empty, run load_ingredients first.')
+        rng = random.Random(options['seed'])
+        queries = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            start = rng.randrange(len(name)) if rng.random() < 0.3 else 0
+            queries.append(name[start:start + rng.randint(1, 4)])
+
+        self.stdout.write(f'{len(names)} ingredients, {len(queries)} queries')
+        self._report('icontains', queries, lambda query: list(
+            Ingredient.objects.filter(name__icontains=query)
+        ))
+        with override_settings(INGREDIENT_SEARCH_BACKEND='database'):
+            self._report('database', queries, search_ingredients)
+        with override_settings(INGREDIENT_SEARCH_BACKEND='memory'):
+            # Build the index before timing.
+            search_ingredients('')
+            self._report('memory', queries, search_ingredients)
+
+    def _report(self, label, queries, search):
+        timings = measure(search, [(query,) for query in queries])
+        self.stdout.write(f'{label:>10}: {describe(timings, 3)}')
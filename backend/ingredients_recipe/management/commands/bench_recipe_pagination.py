@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from ingredients_recipe.models import Recipe
+from ingredients_recipe.paginatior import RecipeCursorPagination
+from main.bench import describe, measure, rolled_back
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare deep-page latency of page-number and cursor pagination.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(**options)
+
+    def _run(self, page, limit, repeat, **options):
+        needed = page * limit
+        missing = needed - Recipe.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} temporary recipes...')
+            author, _ = User.objects.get_or_create(
+                username='bench-author', defaults={'email': 'bench-author@example.com'}
+            )
+            Recipe.objects.bulk_create([
+                Recipe(author=author, name=f'Bench {i}', image='bench.png', text='text', cooking_time=1)
+                for i in range(missing)
+            ], batch_size=5000)
+
+        client = APIClient()
+        offset_url = f'/api/recipes/?page={page}&limit={limit}'
+        boundary = Recipe.objects.order_by('-pub_date', '-id').values_list(
+            'pub_date', flat=True
+        )[(page - 1) * limit - 1]
+        paginator = RecipeCursorPagination()
+        paginator.base_url = f'/api/recipes/?limit={limit}'
+        cursor_url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(boundary)))
+
+        self.stdout.write(f'Page {page} of {limit} recipes:')
+        self._report('page-number', client, offset_url, repeat)
+        self._report('cursor', client, cursor_url, repeat)
+
+    def _report(self, label, client, url, repeat):
+        def get():
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+
+        self.stdout.write(f'{label:>12}: {describe(measure(get, [()] * repeat))}')
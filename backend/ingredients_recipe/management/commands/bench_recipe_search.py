@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from ingredients_recipe import fulltext
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient
+from main.bench import describe, measure, rolled_back
+
+User = get_user_model()
+
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'котлеты', 'запеканка', 'блины', 'рагу', 'плов',
+    'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'томатный', 'грибной', 'куриный',
+    'овощной', 'праздничный', 'нарезать', 'обжарить', 'тушить', 'запекать', 'посолить',
+    'перемешать', 'добавить', 'варить', 'духовка', 'сковорода', 'кастрюля', 'минут', 'огонь',
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare recipe search latency: icontains vs the full-text index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--ingredients', type=int, default=6, help='Per seeded recipe.')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not fulltext.has_index():
+            raise CommandError(f'No full-text index on {connection.vendor}.')
+        with rolled_back():
+            self._run(**options)
+
+    def _run(self, recipes, ingredients, queries, seed, **options):
+        rng = random.Random(seed)
+        pantry = list(Ingredient.objects.all()) or Ingredient.objects.bulk_create([
+            Ingredient(name=f'{word} {i}', measurement_unit='г') for i, word in enumerate(WORDS)
+        ])
+        missing = recipes - Recipe.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} temporary recipes...')
+            author, _ = User.objects.get_or_create(
+                username='bench-author', defaults={'email': 'bench-author@example.com'}
+            )
+            dishes = Recipe.objects.bulk_create([
+                Recipe(author=author, name=' '.join(rng.sample(WORDS[:20], 3)), image='bench.png',
+                       text=' '.join(rng.choices(WORDS, k=40)), cooking_time=10)
+                for _ in range(missing)
+            ], batch_size=5000)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+                for recipe in dishes for ingredient in rng.sample(pantry, min(ingredients, len(pantry)))
+            ], batch_size=5000)
+        started = time.perf_counter()
+        fulltext.rebuild()
+        self.stdout.write(f'Indexed {Recipe.objects.count()} recipes in {time.perf_counter() - started:.1f} s')
+
+        # Ingredient names and word prefixes, as typed into a search box.
+        sample = [
+            rng.choice(pantry).name if rng.random() < 0.5 else rng.choice(WORDS)[:rng.randint(4, 8)]
+            for _ in range(queries)
+        ]
+        for backend in ('naive', 'fulltext'):
+            with override_settings(RECIPE_SEARCH_BACKEND=backend):
+                self._report(backend, sample)
+
+    def _report(self, label, queries):
+        found = []
+
+        def search(query):
+            # What a feed page does: the first page and the total.
+            results = fulltext.search_recipes(Recipe.objects.all(), query)
+            list(results[:10])
+            found.append(results.count())
+
+        timings = measure(search, [(query,) for query in queries])
+        self.stdout.write(f'{label:>10}: {describe(timings)}, {statistics.mean(found):.0f} matches per query')
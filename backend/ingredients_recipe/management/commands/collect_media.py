@@ -0,0 +1,26 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main.storage import is_recent, referenced_names, walk
+
+
+class Command(BaseCommand):
+    help = 'Delete media files that no recipe or avatar references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the orphaned files.')
+
+    def handle(self, *args, **options):
+        referenced = referenced_names()
+        orphans = [
+            name for name in walk(default_storage)
+            if name not in referenced and not is_recent(default_storage, name)
+        ]
+        size = sum(default_storage.size(name) for name in orphans)
+        if not options['dry_run']:
+            for name in orphans:
+                default_storage.delete(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(orphans)} files, {size / 1024 / 1024:.1f} MB'
+        ))
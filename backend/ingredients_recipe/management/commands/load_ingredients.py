@@ -0,0 +1,105 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ingredients_recipe.models import Ingredient, normalize_name
+from main.response_cache import invalidate
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def iter_json(file, chunk_size=65536):
+    """Yield objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise CommandError('Expected a JSON array of ingredients.')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Malformed JSON in ingredient file.')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = end
+        yield item['name'], item['measurement_unit']
+
+
+def unique_ingredients(rows):
+    seen = set()
+    for name, measurement_unit in rows:
+        key = (name.strip(), measurement_unit.strip())
+        if not key[0] or key in seen:
+            continue
+        seen.add(key)
+        yield Ingredient(
+            name=key[0],
+            measurement_unit=key[1],
+            search_name=normalize_name(key[0]),
+        )
+
+
+class Command(BaseCommand):
+    help = 'Load ingredients from a CSV (name,unit) or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH))
+        parser.add_argument('--format', choices=['csv', 'json'])
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError('Cannot detect file format, pass --format.')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        before = Ingredient.objects.count()
+        processed = 0
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file, transaction.atomic():
+            rows = iter_csv(file) if file_format == 'csv' else iter_json(file)
+            ingredients = unique_ingredients(rows)
+            while batch := list(islice(ingredients, chunk_size)):
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                processed += len(batch)
+            # bulk_create sends no signals.
+            invalidate('ingredients')
+        elapsed = time.perf_counter() - started
+
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} unique rows, created {created} ingredients '
+            f'in {elapsed:.2f} s ({processed / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
@@ -0,0 +1,24 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.images import is_processed, process_image
+
+
+class Command(BaseCommand):
+    help = 'Re-encode recipe pictures and avatars that were never processed.'
+
+    def handle(self, *args, **options):
+        for label in settings.IMAGE_SIZES:
+            model_label, field = label.rsplit('.', 1)
+            model = apps.get_model(model_label)
+            rows = model.objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).values_list('pk', field)
+            pending = [(pk, name) for pk, name in rows.iterator() if not is_processed(name)]
+            for pk, name in pending:
+                try:
+                    process_image(label, pk, name)
+                except (OSError, ValueError) as error:
+                    self.stderr.write(f'{label} #{pk}: {error}')
+            self.stdout.write(self.style.SUCCESS(f'{label}: {len(pending)} processed'))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+
+from main import profiling
+
+COLUMNS = (
+    ('total', 'total ms'),
+    ('db', 'db ms'),
+    ('queries', 'queries'),
+    ('serialize', 'serialize ms'),
+    ('size', 'size B'),
+)
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def describe(counts):
+    if not counts:
+        return '-'
+    return '/'.join(f'{profiling.percentile(counts, fraction):g}' for fraction in PERCENTILES)
+
+
+class Command(BaseCommand):
+    help = 'Show p50/p95/p99 of the per-endpoint profiling histograms, or switch profiling.'
+
+    def add_arguments(self, parser):
+        switch = parser.add_mutually_exclusive_group()
+        switch.add_argument('--enable', action='store_true', help='Turn profiling on in every process.')
+        switch.add_argument('--disable', action='store_true', help='Turn profiling off in every process.')
+        parser.add_argument('--reset', action='store_true', help='Drop the collected histograms.')
+        parser.add_argument('--sort', choices=[metric for metric, _ in COLUMNS], default='total',
+                            help='Order endpoints by the p95 of this metric.')
+
+    def handle(self, *args, **options):
+        if options['enable'] or options['disable']:
+            profiling.set_enabled(options['enable'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Profiling {"enabled" if options["enable"] else "disabled"}; '
+                f'processes pick it up within {profiling.POLL_INTERVAL} s.'
+            ))
+            return
+
+        profiling.flush()
+        histograms = profiling.collect()
+        if not histograms:
+            self.stdout.write('No profiled requests yet.')
+        else:
+            self._report(histograms, options['sort'])
+        if options['reset']:
+            profiling.reset()
+            self.stdout.write(self.style.SUCCESS('Histograms reset.'))
+
+    def _report(self, histograms, sort):
+        rows = sorted(
+            histograms.items(),
+            key=lambda item: profiling.percentile(item[1][sort], 0.95) or 0,
+            reverse=True,
+        )
+        header = ['endpoint', 'requests'] + [f'{title} p50/95/99' for _, title in COLUMNS]
+        table = [header] + [
+            [endpoint, str(sum(metrics['total'].values()))]
+            + [describe(metrics[metric]) for metric, _ in COLUMNS]
+            for endpoint, metrics in rows
+        ]
+        widths = [max(len(row[column]) for row in table) for column in range(len(header))]
+        for row in table:
+            self.stdout.write('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ingredients_recipe.fulltext import has_index, rebuild
+from ingredients_recipe.models import RecipeSearch
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the full-text recipe search index from the recipe tables.'
+
+    def handle(self, *args, **options):
+        if not has_index():
+            raise CommandError('This database has no full-text index, recipes are searched with icontains.')
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{RecipeSearch.objects.count()} recipes indexed.'))
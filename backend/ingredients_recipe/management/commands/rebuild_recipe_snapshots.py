@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ingredients_recipe.models import Recipe
+from ingredients_recipe.snapshots import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Build the stored JSON snapshots of recipes that have none, or of all recipes with --all.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every snapshot, not only missing ones.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Recipe.objects.update(snapshot='')
+        built = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{built} snapshots built.'))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('ingredients_recipe', 'Ingredient')
+    RecipeIngredient = apps.get_model('ingredients_recipe', 'RecipeIngredient')
+    keep = {}
+    for pk, name, unit in Ingredient.objects.order_by('id').values_list(
+        'id', 'name', 'measurement_unit'
+    ):
+        original = keep.setdefault((name, unit), pk)
+        if original == pk:
+            continue
+        for row in RecipeIngredient.objects.filter(ingredient_id=pk):
+            if RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=original
+            ).exists():
+                row.delete()
+            else:
+                row.ingredient_id = original
+                row.save(update_fields=['ingredient'])
+        Ingredient.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+    # The merge commits on its own: PostgreSQL refuses to alter a table with
+    # foreign key triggers of the same transaction still pending.
+    atomic = False
+
+    dependencies = [
+        ('ingredients_recipe', '0003_ingredient_search_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
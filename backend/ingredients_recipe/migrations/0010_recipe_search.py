@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ingredients_recipe import fulltext
+
+
+def create_index(apps, schema_editor):
+    fulltext.create_table(schema_editor)
+    fulltext.rebuild()
+
+
+def drop_index(apps, schema_editor):
+    fulltext.drop_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients_recipe', '0009_recipe_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='ingredients_recipe.recipe')),
+                ('document', models.TextField()),
+            ],
+            options={
+                'db_table': 'ingredients_recipe_recipesearch',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
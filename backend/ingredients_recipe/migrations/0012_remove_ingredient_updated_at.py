@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 22:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients_recipe', '0011_ingredient_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ingredient',
+            name='updated_at',
+        ),
+    ]
@@ -2,18 +2,43 @@ from django.contrib.auth import get_user_model
 from django.db import models
 
 
+def normalize_name(name):
+    return name.strip().casefold()
+
+
 class Ingredient(models.Model):
     name = models.CharField(max_length=128)
     measurement_unit = models.CharField(max_length=64)
+    search_name = models.CharField(max_length=128, default='', editable=False)
 
     class Meta:
         ordering = ['name']
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        indexes = [
+            models.Index(
+                fields=['search_name'],
+                name='ingredient_search_name_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
 
 User = get_user_model()
 
@@ -22,19 +47,36 @@ class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes')
     name = models.CharField(max_length=256)
     image = models.ImageField()
+    image_variants = models.JSONField(default=dict, editable=False)
     text = models.TextField()
     cooking_time = models.PositiveSmallIntegerField()
     ingredients = models.ManyToManyField('Ingredient', through='RecipeIngredient', related_name='recipes')
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(default=0, editable=False)
+    # Viewer-independent JSON, see ingredients_recipe.snapshots.
+    snapshot = models.TextField(default='', editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='recipe_feed_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The stored snapshot may not match the saved fields any more.
+        self.snapshot = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'snapshot'}
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
@@ -54,3 +96,16 @@ class RecipeIngredient(models.Model):
 
     def __str__(self):
         return f'{self.amount} of {self.ingredient} for {self.recipe}'
+
+
+class RecipeSearch(models.Model):
+    """Full-text index entry of a recipe, see ingredients_recipe.fulltext."""
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_entry'
+    )
+    document = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'ingredients_recipe_recipesearch'
@@ -0,0 +1,89 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from ingredients_recipe.catalogue import get_catalogue
+from ingredients_recipe.models import Ingredient, normalize_name
+
+_index = (None, None)
+
+
+class IngredientTrie:
+    """Prefix tree over normalized ingredient names."""
+
+    def __init__(self, ingredients=()):
+        self._root = {}
+        for ingredient in ingredients:
+            self.insert(ingredient)
+
+    def insert(self, ingredient):
+        node = self._root
+        for char in ingredient.search_name:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(ingredient)
+
+    def search(self, prefix, limit):
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        result = []
+        stack = [node]
+        while stack and len(result) < limit:
+            node = stack.pop()
+            result.extend(node.get(None, ()))
+            stack.extend(node[char] for char in sorted(
+                (char for char in node if char is not None), reverse=True
+            ))
+        return result[:limit]
+
+
+class IngredientIndex:
+    def __init__(self, ingredients):
+        self.ingredients = ingredients
+        self.trie = IngredientTrie(ingredients)
+
+    def search(self, query, limit):
+        result = self.trie.search(query, limit)
+        if len(result) < limit:
+            result += islice((
+                ingredient for ingredient in self.ingredients
+                if query in ingredient.search_name
+                and not ingredient.search_name.startswith(query)
+            ), limit - len(result))
+        return result
+
+
+def get_index(version=None):
+    global _index
+    catalogue = get_catalogue(version)
+    version, index = _index
+    if version != catalogue.version:
+        index = IngredientIndex(catalogue.ingredients)
+        _index = (catalogue.version, index)
+    return index
+
+
+def use_memory_index():
+    backend = settings.INGREDIENT_SEARCH_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'sqlite'
+    return backend == 'memory'
+
+
+def search_ingredients(name, limit=None, version=None):
+    """Return ingredients whose name starts with ``name``, then those containing it."""
+    query = normalize_name(name)
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    if use_memory_index():
+        return get_index(version).search(query, limit)
+    result = list(Ingredient.objects.filter(search_name__startswith=query)[:limit])
+    if len(result) < limit:
+        result += Ingredient.objects.filter(
+            search_name__contains=query
+        ).exclude(
+            search_name__startswith=query
+        )[:limit - len(result)]
+    return result
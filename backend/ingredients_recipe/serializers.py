@@ -1,16 +1,20 @@
-import base64
-import uuid
-from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
+from django.http import Http404
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
 from custom_user.serializers import BaseUserSerializer
+from ingredients_recipe.catalogue import get_ingredients
 from ingredients_recipe.models import Ingredient
 from ingredients_recipe.models import Recipe, RecipeIngredient
+from ingredients_recipe.snapshots import absolute_url, fill, loads, store
 from django.contrib.auth import get_user_model
 
+from main.images import Base64ImageField, SizedImageField, schedule
+from main.storage import image_names, release_on_commit
 from main.settings import MIN_COOKING_TIME, MAX_COOKING_TIME
+from relations.counters import increment
+from relations.shopping_list import change_recipe, get_recipe_amounts
 
 User = get_user_model()
 
@@ -31,10 +35,21 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeFeedSerializer(serializers.ListSerializer):
+    """``RecipeListSerializer(many=True)`` building a page's missing snapshots at once."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        fill(recipes)
+        # Recipes deleted since the page was read have no snapshot to show.
+        return [self.child.to_representation(recipe) for recipe in recipes if recipe.snapshot]
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = BaseUserSerializer(read_only=True)
+    image = SizedImageField()
     ingredients = RecipeIngredientReadSerializer(
         source='recipe_ingredients',
         many=True
@@ -45,56 +60,68 @@ class RecipeListSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'text', 'cooking_time',
+            'favorites_count', 'in_carts_count'
+        )
+        list_serializer_class = RecipeFeedSerializer
+
+    def to_representation(self, recipe):
+        """The stored snapshot with the viewer's flags and the current counters."""
+        if not recipe.snapshot:
+            fill([recipe])
+            if not recipe.snapshot:
+                raise Http404
+        data = loads(recipe.snapshot)
+        request = self.context.get('request')
+        author = data['author']
+        author['avatar'] = absolute_url(request, author['avatar'])
+        author['is_subscribed'] = self.fields['author'].get_is_subscribed(recipe.author)
+        author['subscribers_count'] = recipe.author.subscribers_count
+        author['recipes_count'] = recipe.author.recipes_count
+        image = data['image'] and (
+            data['image_variants'].get(self.context.get('image_size', 'detail')) or data['image']
         )
+        return {
+            'id': data['id'],
+            'author': author,
+            'ingredients': data['ingredients'],
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'name': data['name'],
+            'image': absolute_url(request, image),
+            'text': data['text'],
+            'cooking_time': data['cooking_time'],
+            'favorites_count': recipe.favorites_count,
+            'in_carts_count': recipe.in_carts_count,
+        }
 
     def get_is_favorited(self, recipe):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         return user.favorites.filter(recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         return user.shopping_cart.filter(recipe=recipe).exists()
 
 
 class RecipeIngredientWriteSerializer(serializers.Serializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_COOKING_TIME,
         max_value=MAX_COOKING_TIME)
 
 
-class ImageField(serializers.Field):
-
-    def to_internal_value(self, data):
-        try:
-            format_, imgstr = data.split(';base64,')
-            ext = format_.split('/')[-1]
-            return ContentFile(
-                base64.b64decode(imgstr),
-                name=f'{uuid.uuid4()}.{ext}'
-            )
-        except Exception:
-            raise serializers.ValidationError('Неверный формат изображения')
-
-
-class ImageSerializerField(serializers.Field):
-    def to_internal_value(self, data):
-        try:
-            format_, imgstr = data.split(';base64,')
-            ext = format_.split('/')[-1]
-            return ContentFile(base64.b64decode(imgstr), name=f'{uuid.uuid4()}.{ext}')
-        except:
-            raise serializers.ValidationError('Некорректный формат изображения')
-
-
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientWriteSerializer(many=True)
-    image = ImageSerializerField()
+    image = Base64ImageField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_COOKING_TIME,
         max_value=MAX_COOKING_TIME)
@@ -113,6 +140,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             if ingredient['id'] in ingredient_ids:
                 raise serializers.ValidationError('')
             ingredient_ids.add(ingredient['id'])
+        ingredients = get_ingredients(ingredient_ids)
+        missing = ingredient_ids - ingredients.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, sorted(missing)))}'
+            )
+        for ingredient in value:
+            ingredient['id'] = ingredients[ingredient['id']]
         return value
 
     @transaction.atomic
@@ -128,6 +163,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             **validated_data
         )
         self._save_ingredients(recipe, ingredients)
+        increment(User, recipe.author_id, 'recipes_count')
+        schedule(recipe, 'image')
+        store(recipe)
         return recipe
 
     @transaction.atomic
@@ -139,9 +177,18 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if ingredients is None:
             raise serializers.ValidationError('Укажите ингредиенты')
 
+        old_amounts = get_recipe_amounts(recipe)
         recipe.recipe_ingredients.all().delete()
         self._save_ingredients(recipe, ingredients)
-        return super().update(recipe, validated_data)
+        change_recipe(recipe, old_amounts)
+        old_images = image_names(recipe, 'image')
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        recipe = super().update(recipe, validated_data)
+        release_on_commit(*old_images - image_names(recipe, 'image'))
+        schedule(recipe, 'image')
+        store(recipe)
+        return recipe
 
     def _save_ingredients(self, recipe, ingredients):
         RecipeIngredient.objects.bulk_create([
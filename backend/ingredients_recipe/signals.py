@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ingredients_recipe.fulltext import reindex_on_commit
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient
+from main.response_cache import invalidate
+from main.storage import image_names, release_on_commit
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(recipe_ingredients__ingredient=instance).update(
+            updated_at=timezone.now(), snapshot=''
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields and 'name' not in update_fields:
+        return
+    reindex_on_commit(*Recipe.objects.filter(
+        recipe_ingredients__ingredient=instance
+    ).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reindex_recipe(sender, instance, update_fields=None, **kwargs):
+    # Image processing and other partial saves leave the words alone.
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    reindex_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate('recipes', f'recipe:{instance.pk}')
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(updated_at=timezone.now(), snapshot='')
+    reindex_on_commit(instance.recipe_id)
+    invalidate('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    release_on_commit(*image_names(instance, 'image'))
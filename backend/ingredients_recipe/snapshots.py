@@ -0,0 +1,109 @@
+"""Viewer-independent JSON of every recipe, stored in ``Recipe.snapshot``."""
+import json
+
+from django.db.models import Case, F, TextField, Value, When, prefetch_related_objects
+
+from ingredients_recipe.models import Recipe
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Author fields copied into the snapshots of their recipes.
+AUTHOR_FIELDS = ('email', 'first_name', 'last_name', 'avatar', 'username')
+
+# Columns a read does not need once the snapshot is there.
+DEFERRED_FIELDS = (
+    'name', 'image', 'image_variants', 'text', 'cooking_time',
+    *(f'author__{field}' for field in AUTHOR_FIELDS),
+)
+
+BATCH_SIZE = 500
+
+loads = json.loads if orjson is None else orjson.loads
+
+
+def file_url(file, name=None):
+    if not file:
+        return None
+    return file.storage.url(name or file.name)
+
+
+def absolute_url(request, url):
+    if url is None or request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def build(recipe):
+    """Snapshot of ``recipe`` with ``author`` and ``recipe_ingredients__ingredient`` loaded."""
+    author = recipe.author
+    return json.dumps({
+        'id': recipe.id,
+        'author': {
+            'id': author.id,
+            'email': author.email,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'avatar': file_url(author.avatar),
+            'username': author.username,
+        },
+        'ingredients': [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            } for item in recipe.recipe_ingredients.all()
+        ],
+        'name': recipe.name,
+        'image': file_url(recipe.image),
+        'image_variants': {
+            size: file_url(recipe.image, name) for size, name in recipe.image_variants.items() if name
+        } if recipe.image else {},
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }, ensure_ascii=False, separators=(',', ':'))
+
+
+def store(recipe):
+    """Rebuild and save the snapshot of ``recipe`` right after writing it."""
+    recipe._prefetched_objects_cache = {}
+    prefetch_related_objects([recipe], 'recipe_ingredients__ingredient')
+    recipe.snapshot = build(recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(snapshot=recipe.snapshot)
+
+
+def fill(recipes):
+    """Give ``recipes`` their snapshots, building and saving the missing ones."""
+    missing = {}
+    for recipe in recipes:
+        if not recipe.snapshot:
+            missing.setdefault(recipe.pk, []).append(recipe)
+    if not missing:
+        return
+    fresh = list(Recipe.objects.select_related('author').prefetch_related(
+        'recipe_ingredients__ingredient'
+    ).filter(pk__in=missing))
+    snapshots = {recipe.pk: build(recipe) for recipe in fresh}
+    # A write committed after the read above moved updated_at; its row is
+    # left alone and rebuilt by the next read.
+    Recipe.objects.filter(pk__in=snapshots, snapshot='').update(snapshot=Case(
+        *(When(pk=recipe.pk, updated_at=recipe.updated_at, then=Value(snapshots[recipe.pk]))
+          for recipe in fresh),
+        default=F('snapshot'),
+        output_field=TextField(),
+    ))
+    for pk, snapshot in snapshots.items():
+        for recipe in missing[pk]:
+            recipe.snapshot = snapshot
+
+
+def rebuild(queryset=None):
+    """Fill the missing snapshots of ``queryset``, all recipes by default; return their number."""
+    queryset = Recipe.objects.all() if queryset is None else queryset
+    pks = list(queryset.filter(snapshot='').order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        fill(Recipe.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).only('pk', 'snapshot'))
+    return len(pks)
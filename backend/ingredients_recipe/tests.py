@@ -0,0 +1,519 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer, ModelSerializer
+from rest_framework.test import APITestCase
+
+from custom_user.models import Subscription
+from ingredients_recipe import fulltext, snapshots
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient, RecipeSearch
+from ingredients_recipe.serializers import RecipeFeedSerializer, RecipeListSerializer
+from ingredients_recipe.views import RecipeViewSet
+from main.renderers import FastJSONRenderer
+from main.response_cache import invalidate
+from main.testing import create_ingredients, create_recipes, create_user, recipe_data, token_header
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
+
+
+class RecipeListQueriesTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.author = create_user('author')
+        self.ingredients = create_ingredients(3)
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+
+    def _queries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def _relation_queries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'relations_' in query['sql']
+        ]
+
+    def test_flags_are_annotated(self):
+        recipes = create_recipes(self.author, 4, self.ingredients)
+        FavoriteUserRecipe.objects.create(user=self.user, recipe=recipes[0])
+        ShoppingCartUserRecipe.objects.create(user=self.user, recipe=recipes[1])
+
+        response = self.client.get('/api/recipes/', {'limit': 10})
+
+        flags = {
+            item['id']: (item['is_favorited'], item['is_in_shopping_cart'])
+            for item in response.data['results']
+        }
+        self.assertEqual(flags[recipes[0].id], (True, False))
+        self.assertEqual(flags[recipes[1].id], (False, True))
+        self.assertEqual(flags[recipes[2].id], (False, False))
+
+    def test_flag_queries_do_not_grow_with_page_size(self):
+        create_recipes(self.author, 30, self.ingredients)
+        self.assertEqual(
+            len(self._relation_queries(2)),
+            len(self._relation_queries(30))
+        )
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for i in range(10):
+            author = create_user(f'author{i}')
+            create_recipes(author, 3, self.ingredients)
+            if i % 2:
+                Subscription.objects.create(from_source=self.user, to=author)
+        self.assertEqual(self._queries(2), self._queries(30))
+
+    def test_author_is_subscribed_from_page_set(self):
+        create_recipes(self.author, 1)
+        other = create_user('other')
+        create_recipes(other, 1)
+        Subscription.objects.create(from_source=self.user, to=self.author)
+
+        response = self.client.get('/api/recipes/')
+
+        subscribed = {
+            item['author']['id']: item['author']['is_subscribed']
+            for item in response.data['results']
+        }
+        self.assertEqual(subscribed, {self.author.id: True, other.id: False})
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_update_response_uses_new_ingredients(self):
+        recipe = create_recipes(self.user, 1, self.ingredients[:1])[0]
+
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', recipe_data([(self.ingredients[2].id, 7)], name='Updated'),
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['id'], item['amount']) for item in response.data['ingredients']],
+            [(self.ingredients[2].id, 7)]
+        )
+
+    def test_unknown_ingredient_is_rejected(self):
+        response = self.client.post(
+            '/api/recipes/', recipe_data([(self.ingredients[0].id, 1), (999999, 1)], name='New'),
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.filter(name='New').exists())
+
+    def test_cursor_mode_walks_feed_without_count(self):
+        recipes = create_recipes(self.author, 7)
+        expected = self.client.get('/api/recipes/', {'limit': 10}).data['results']
+
+        ids = []
+        url = '/api/recipes/?cursor=&limit=3'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(ids, [item['id'] for item in expected])
+        self.assertEqual(len(ids), len(recipes))
+
+
+class IngredientSearchTest(APITestCase):
+
+    def setUp(self):
+        for name in ('Сливки', 'сливочное масло', 'масло сливочное', 'соль', 'Кокосовые сливки'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        cache.clear()
+
+    def _names(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_prefix_matches_rank_first(self):
+        for backend in ('memory', 'database'):
+            with self.subTest(backend=backend), override_settings(INGREDIENT_SEARCH_BACKEND=backend):
+                self.assertEqual(self._names('СЛИВ'), [
+                    'Сливки', 'сливочное масло', 'Кокосовые сливки', 'масло сливочное'
+                ])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_result_size_is_capped(self):
+        for backend in ('memory', 'database'):
+            with self.subTest(backend=backend), override_settings(INGREDIENT_SEARCH_BACKEND=backend):
+                self.assertEqual(len(self._names('с')), 2)
+
+    def test_fixture_ingredients_are_searchable(self):
+        create_ingredients(3)
+        for backend in ('memory', 'database'):
+            with self.subTest(backend=backend), override_settings(INGREDIENT_SEARCH_BACKEND=backend):
+                self.assertEqual(self._names('Ingredient 0'), ['ingredient 00', 'ingredient 01', 'ingredient 02'])
+
+    @override_settings(INGREDIENT_SEARCH_BACKEND='memory')
+    def test_memory_index_follows_writes(self):
+        self.assertEqual(self._names('сахар'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        self.assertEqual(self._names('сахар'), ['Сахар'])
+
+    def test_catalogue_is_served_from_memory(self):
+        self.client.get('/api/ingredients/')
+        # The version comes from the shared cache.
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/')
+        self.assertEqual(len(response.data), Ingredient.objects.count())
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'measurement_unit'})
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_catalogue_follows_the_shared_version(self):
+        salt = Ingredient.objects.get(name='соль')
+        self.client.get('/api/ingredients/')
+        # Another worker writes the row and bumps the tag once it commits.
+        Ingredient.objects.filter(pk=salt.pk).update(name='Соль морская', search_name='соль морская')
+        self.assertEqual(self._names('мор'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate('ingredients')
+        self.assertEqual(self._names('мор'), ['Соль морская'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            salt.delete()
+        self.client.force_authenticate(create_user('author'))
+        response = self.client.post('/api/recipes/', recipe_data([(salt.id, 1)]), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+
+    def test_bench_command_runs(self):
+        out = io.StringIO()
+        call_command('bench_ingredient_search', '--queries', '5', stdout=out)
+        self.assertEqual(
+            [line.split(':')[0].strip() for line in out.getvalue().splitlines()[1:]],
+            ['icontains', 'database', 'memory']
+        )
+
+
+class LoadIngredientsTest(APITestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def _load(self, name, content, *args):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        call_command('load_ingredients', str(path), *args, stdout=io.StringIO())
+
+    def test_csv_is_deduplicated_and_idempotent(self):
+        content = 'соль,г\nсоль,г\nсоль,щепотка\nсахар,г\n'
+        self._load('ingredients.csv', content, '--chunk-size', '1')
+        self._load('ingredients.csv', content)
+
+        self.assertEqual(Ingredient.objects.count(), 3)
+        self.assertEqual(Ingredient.objects.get(name='сахар').search_name, 'сахар')
+
+    def test_json_is_streamed(self):
+        self.client.get('/api/ingredients/')
+        rows = [{'name': f'Ингредиент {i}', 'measurement_unit': 'г'} for i in range(50)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self._load('ingredients.json', json.dumps(rows, ensure_ascii=False, indent=1))
+
+        self.assertEqual(Ingredient.objects.count(), 50)
+        self.assertEqual(len(self.client.get('/api/ingredients/').data), 50)
+
+
+# Counters windows no test run crosses.
+@override_settings(FEED_COUNTERS_MAX_AGE=10 ** 9)
+class ConditionalGetTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(name='Мука', measurement_unit='г')
+        self.recipes = create_recipes(self.author, 2, [self.ingredient])
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def _assert_not_modified(self, url, response, queries):
+        with self.assertNumQueries(queries):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+    def _assert_modified(self, url, response):
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+        return fresh
+
+    def test_detail_validators(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self._assert_not_modified(url, response, 1)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        self.client.post(f'{url}favorite/')
+        # Last-Modified stays put: only the ETag tells the flag changed.
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+        response = self._assert_modified(url, response)
+        self.assertTrue(response.data['is_favorited'])
+
+        self.author.first_name = 'Пётр'
+        self.author.save()
+        response = self._assert_modified(url, response)
+
+        self.ingredient.name = 'Мука пшеничная'
+        self.ingredient.save()
+        response = self._assert_modified(url, response)
+        self.assertEqual(response.data['ingredients'][0]['name'], 'Мука пшеничная')
+
+        self.client.force_authenticate(self.author)
+        self._assert_modified(url, response)
+
+    def test_feed_validators(self):
+        url = '/api/recipes/'
+        response = self.client.get(url)
+        self._assert_not_modified(url, response, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[1].delete()
+        self._assert_modified(url, response)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+    def test_cached_body_matches_validators(self):
+        self.client.force_authenticate(None)
+        url = '/api/recipes/'
+        response = self.client.get(url)
+
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipes[0].id}/favorite/')
+        self.client.force_authenticate(None)
+        self._assert_not_modified(url, response, 2)
+        with override_settings(FEED_COUNTERS_MAX_AGE=0):
+            response = self._assert_modified(url, response)
+        self.assertIn(1, [item['favorites_count'] for item in response.data['results']])
+
+        # A write that skips invalidation still changes the ETag and the body together.
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(favorites_count=5, updated_at=timezone.now())
+        response = self._assert_modified(url, response)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn(5, [item['favorites_count'] for item in response.data['results']])
+        self._assert_not_modified(url, response, 2)
+
+    def test_ingredient_validators(self):
+        url = '/api/ingredients/'
+        response = self.client.get(url)
+        self._assert_not_modified(url, response, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self._assert_modified(url, response)
+
+    def test_unknown_recipe(self):
+        self.assertEqual(self.client.get('/api/recipes/999999/').status_code, 404)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class FeedSerializationTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        authors = [create_user(f'author{i}') for i in range(3)]
+        authors[0].avatar = 'avatar.png'
+        authors[0].save()
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'соль {i}\u2028', measurement_unit='г') for i in range(3)
+        ])
+        recipes = [recipe for author in authors for recipe in create_recipes(author, 3, ingredients)]
+        Recipe.objects.filter(pk=recipes[0].pk).update(image_variants={'list': 'recipe_list.webp'})
+        FavoriteUserRecipe.objects.create(user=self.user, recipe=recipes[1])
+        ShoppingCartUserRecipe.objects.create(user=self.user, recipe=recipes[2])
+        Subscription.objects.create(from_source=self.user, to=authors[1])
+
+    def _pages(self):
+        anonymous = self.client.get('/api/recipes/?limit=20').content
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+        authenticated = self.client.get('/api/recipes/?limit=20').content
+        self.client.credentials()
+        return anonymous, authenticated
+
+    def test_fast_path_matches_drf_serializers(self):
+        fast = self._pages()
+        with mock.patch.object(RecipeListSerializer.Meta, 'list_serializer_class', ListSerializer), \
+                mock.patch.object(RecipeListSerializer, 'to_representation', ModelSerializer.to_representation), \
+                mock.patch.object(RecipeViewSet, 'renderer_classes', [JSONRenderer]):
+            expected = self._pages()
+
+        self.assertIsInstance(RecipeListSerializer(many=True), RecipeFeedSerializer)
+        self.assertEqual(fast, expected)
+        self.assertIn(b'recipe_list.webp', fast[0])
+        self.assertIn(b'"is_subscribed":true', fast[1])
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {'text': 'щи \u2028 "quoted"', 'lazy': gettext_lazy('Invalid token.'), 1: [None, True, 2**70],
+                'when': timezone.now(), 'ids': {3}, 'nested': [{'a': 1.5}]}
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({'a': 'b'}), JSONRenderer().render({'a': 'b'}))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RecipeSnapshotTest(APITestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.recipe = create_recipes(self.author, 1, [self.ingredient])[0]
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def _snapshot(self):
+        return Recipe.objects.get(pk=self.recipe.pk).snapshot
+
+    def test_read_fills_snapshot_and_skips_ingredients(self):
+        self.assertEqual(self._snapshot(), '')
+        first = self.client.get(self.url).content
+        self.assertNotEqual(self._snapshot(), '')
+
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(self.url).content
+
+        self.assertEqual(first, second)
+        self.assertFalse(any('recipeingredient' in query['sql'] for query in context.captured_queries))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_create_stores_snapshot(self):
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.author))
+        response = self.client.post(
+            '/api/recipes/', recipe_data([(self.ingredient.id, 3)], name='New'), format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        snapshot = json.loads(Recipe.objects.get(pk=response.data['id']).snapshot)
+        self.assertEqual((snapshot['name'], snapshot['ingredients'][0]['amount']), ('New', 3))
+        self.assertEqual(self.client.get(f'/api/recipes/{response.data["id"]}/').data['name'], 'New')
+
+    def test_author_and_ingredient_changes_expire_snapshot(self):
+        self.client.get(self.url)
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assertEqual(self._snapshot(), '')
+        self.assertEqual(self.client.get(self.url).data['author']['first_name'], 'Renamed')
+
+        self.ingredient.name = 'перец'
+        self.ingredient.save()
+        self.assertEqual(self._snapshot(), '')
+        self.assertEqual(self.client.get(self.url).data['ingredients'][0]['name'], 'перец')
+
+        self.author.save(update_fields=['last_login'])
+        self.assertNotEqual(self._snapshot(), '')
+
+    def test_toggles_keep_snapshot(self):
+        self.client.get(self.url)
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.author))
+        self.assertEqual(self.client.post(f'{self.url}favorite/').status_code, 201)
+
+        self.assertNotEqual(self._snapshot(), '')
+        data = self.client.get(self.url).data
+        self.assertEqual((data['is_favorited'], data['favorites_count']), (True, 1))
+
+    def test_fill_leaves_rows_written_meanwhile(self):
+        build = snapshots.build
+
+        def racing_build(recipe):
+            Recipe.objects.filter(pk=recipe.pk).update(name='Newer', updated_at=timezone.now())
+            return build(recipe)
+
+        with mock.patch.object(snapshots, 'build', racing_build):
+            snapshots.fill([self.recipe])
+
+        self.assertEqual(self._snapshot(), '')
+        self.assertEqual(self.client.get(self.url).data['name'], 'Newer')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RecipeSearchTest(APITestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.beet, self.salt = Ingredient.objects.bulk_create([
+            Ingredient(name='свёкла', measurement_unit='г'),
+            Ingredient(name='соль', measurement_unit='г'),
+        ])
+        self.borsch, self.soup, self.salad = create_recipes(self.author, 3)
+        Recipe.objects.filter(pk=self.borsch.pk).update(name='Борщ', text='Сварить с капустой.')
+        Recipe.objects.filter(pk=self.soup.pk).update(name='Суп', text='Посолить и подать, борщ не нужен.')
+        Recipe.objects.filter(pk=self.salad.pk).update(name='Салат', text='Нарезать.')
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=self.borsch, ingredient=self.beet, amount=1),
+            RecipeIngredient(recipe=self.salad, ingredient=self.salt, amount=1),
+        ])
+        fulltext.rebuild()
+
+    def _ids(self, query, backend='auto'):
+        with override_settings(RECIPE_SEARCH_BACKEND=backend):
+            response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_ranks_above_text(self):
+        self.assertEqual(self._ids('борщ'), [self.borsch.id, self.soup.id])
+
+    def test_prefixes_of_all_words_must_match(self):
+        self.assertEqual(self._ids('СВЁК борщ'), [self.borsch.id])
+        self.assertEqual(self._ids('сол'), [self.salad.id])
+        self.assertEqual(self._ids('сол борщ'), [])
+        self.assertEqual(len(self._ids(' "*')), 3)
+
+    def test_naive_backend_finds_the_same(self):
+        # SQLite compares only ASCII letters case-insensitively.
+        self.assertEqual(self._ids('капуст', 'naive'), [self.borsch.id])
+        self.assertEqual(self._ids('свёк посол', 'naive'), [])
+        self.assertEqual(self._ids('свёк', 'naive'), [self.borsch.id])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_index_follows_writes(self):
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.author))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', recipe_data(
+                [(self.salt.id, 3)], name='Окрошка', text='Залить квасом.'
+            ), format='json')
+        created = response.data['id']
+        self.assertEqual(self._ids('квас'), [created])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/recipes/{created}/', {
+                'ingredients': [{'id': self.beet.id, 'amount': 3}],
+                'name': 'Холодник',
+                'text': 'Залить кефиром.',
+                'cooking_time': 5,
+            }, format='json')
+        self.assertEqual(self._ids('квас'), [])
+        self.assertEqual(set(self._ids('свёкла')), {self.borsch.id, created})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beet.name = 'бурак'
+            self.beet.save()
+        self.assertEqual(set(self._ids('бурак')), {self.borsch.id, created})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{created}/')
+        self.assertEqual(self._ids('бурак'), [self.borsch.id])
+        self.assertFalse(RecipeSearch.objects.filter(recipe_id=created).exists())
@@ -1,41 +1,140 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
 
+from ingredients_recipe.catalogue import get_catalogue, get_version
 from ingredients_recipe.filters import RecipeFilter
 from ingredients_recipe.models import Ingredient, Recipe
 from ingredients_recipe.paginatior import RecipePagination
 from ingredients_recipe.permissions import IsAuthorOrReadOnly
+from ingredients_recipe.search import search_ingredients
 from ingredients_recipe.serializers import IngredientSerializer, RecipeListSerializer, RecipeWriteSerializer
+from ingredients_recipe.snapshots import DEFERRED_FIELDS
+from main.conditional import ConditionalGetMixin
+from main.profiling import ProfiledViewMixin, serialize
+from main.renderers import FastJSONRenderer
+from main.response_cache import CachedResponseMixin, get_tag_versions
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from relations.counters import increment
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
+
+User = get_user_model()
+
+COUNTER_FIELDS = ('favorites_count', 'in_carts_count', 'author__subscribers_count', 'author__recipes_count')
+
+
+def counters_window():
+    """The current FEED_COUNTERS_MAX_AGE period, a new value on every call for 0."""
+    max_age = settings.FEED_COUNTERS_MAX_AGE
+    return int(time.time() // max_age) if max_age else uuid.uuid4().hex
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class BaseIngredientViewSet(ProfiledViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['name']
+    catalogue_version = None
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get('name', '')
-        if name:
-            queryset = queryset.filter(name__icontains=name)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        if not name:
+            return Response(get_catalogue(self.catalogue_version).data)
+        serializer = self.get_serializer(search_ingredients(name, version=self.catalogue_version), many=True)
+        return Response(serialize(serializer))
+
+
+class IngredientViewSet(ConditionalGetMixin, CachedResponseMixin, BaseIngredientViewSet):
 
+    def get_cache_tags(self, response):
+        return ['ingredients']
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def get_validators(self):
+        # The catalogue and the search index are then read at the same version.
+        self.catalogue_version = get_version()
+        return self.catalogue_version, None
+
+
+class RecipeViewSet(ConditionalGetMixin, CachedResponseMixin, ProfiledViewMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = RecipePagination
     serializer_class = RecipeListSerializer
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author')
+        if self.action in ('list', 'retrieve'):
+            # Everything else comes from the stored snapshot.
+            queryset = queryset.defer(*DEFERRED_FIELDS)
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteUserRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCartUserRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        return queryset
+
+    def get_cache_tags(self, response):
+        if self.action == 'retrieve':
+            return [f'recipe:{response.data["id"]}', f'user:{response.data["author"]["id"]}', 'ingredients']
+        return ['recipes', 'ingredients']
+
+    def get_validators(self):
+        if self.action == 'retrieve':
+            try:
+                state = Recipe.objects.filter(pk=self.kwargs['pk']).values_list(
+                    'updated_at', 'author__updated_at', *COUNTER_FIELDS
+                ).first()
+            except (TypeError, ValueError):
+                return None
+            return state and (state, max(state[:2]))
+        # The feed is validated as a whole: two index lookups instead of a scan
+        # of the filtered queryset, plus the cache tag bumped on deletions.
+        # Counters, moved by every toggle, only count once per window.
+        updated = Recipe.objects.aggregate(last=Max('updated_at'))['last']
+        author_updated = User.objects.aggregate(last=Max('updated_at'))['last']
+        state = (updated, author_updated, get_tag_versions(['recipes']), counters_window())
+        return state, max(filter(None, (updated, author_updated)), default=None)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        increment(User, instance.author_id, 'recipes_count', -1)
+        instance.delete()
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            kwargs.setdefault('context', self.get_serializer_context())
+            kwargs['context']['subscriptions'] = self._get_subscriptions(args[0])
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
-        if self.action == 'get':
+        if self.action in ('list', 'retrieve'):
             return RecipeListSerializer
         return RecipeWriteSerializer
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
+        context['image_size'] = 'list' if self.action == 'list' else 'detail'
         return context
+
+    def _get_subscriptions(self, recipes):
+        user = self.request.user
+        if not user.is_authenticated:
+            return set()
+        if isinstance(recipes, Recipe):
+            recipes = [recipes]
+        return set(user.from_sender.filter(
+            to_id__in={recipe.author_id for recipe in recipes}
+        ).values_list('to_id', flat=True))
@@ -0,0 +1,78 @@
+"""Minimal async counterpart of DRF's ``api_view`` for small write endpoints."""
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` whose database lookup is awaited."""
+
+    def authenticate_credentials(self, key):
+        # Header parsing stays in TokenAuthentication.authenticate().
+        return key
+
+    async def aauthenticate(self, request):
+        key = self.authenticate(request)
+        if key is None:
+            return None
+        try:
+            token = await self.get_model().objects.select_related('user').aget(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user
+
+
+def respond(data=None, status=200):
+    if data is None:
+        response = HttpResponse(status=status)
+        # DRF drops the content type of empty responses as well.
+        del response['Content-Type']
+        return response
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def handle_exception(exc):
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound(*exc.args)
+    response = respond({'detail': exc.detail}, status=exc.status_code)
+    if getattr(exc, 'auth_header', None):
+        response['WWW-Authenticate'] = exc.auth_header
+    return response
+
+
+def drf_request(request):
+    """Wrap ``request`` for serializers that read ``query_params`` or ``user``."""
+    wrapped = Request(request)
+    wrapped.user = request.user
+    return wrapped
+
+
+def async_api_view(methods):
+    """Decorate ``async def view(request, ...)`` answering ``methods`` like ``@api_view``."""
+    methods = [method.upper() for method in methods]
+    authentication = AsyncTokenAuthentication()
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                request.user = await authentication.aauthenticate(request) or AnonymousUser()
+                return await view(request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    exc.auth_header = authentication.authenticate_header(request)
+                return handle_exception(exc)
+        return wrapper
+    return decorator
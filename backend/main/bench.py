@@ -0,0 +1,56 @@
+"""Timing helpers shared by the ``bench_*`` commands."""
+import math
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.test.utils import override_settings
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back, with any host allowed."""
+    # Responses built from rolled back rows must not reach the shared cache.
+    caches = {**settings.CACHES, 'bench': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench',
+    }}
+    try:
+        with transaction.atomic(), override_settings(
+            ALLOWED_HOSTS=['*'], CACHES=caches, RESPONSE_CACHE_ALIAS='bench',
+        ):
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def measure(function, calls):
+    """Milliseconds taken by ``function(*args)`` for each ``args`` of ``calls``."""
+    timings = []
+    for args in calls:
+        started = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[max(math.ceil(len(ordered) * fraction) - 1, 0)]
+
+
+def describe(timings, precision=2):
+    return ', '.join(
+        f'{name} {value:.{precision}f} ms' for name, value in (
+            ('mean', statistics.fmean(timings)),
+            ('p50', percentile(timings, 0.5)),
+            ('p95', percentile(timings, 0.95)),
+            ('max', max(timings)),
+        )
+    )
@@ -0,0 +1,50 @@
+"""Conditional GET (ETag / Last-Modified) for DRF viewsets."""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """Answer ``list``/``retrieve`` with 304 from ``get_validators()``, before serializing."""
+
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        validators = self.get_validators() if self.action in self.conditional_actions else None
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        state, last_modified = validators
+        digest = hashlib.md5(
+            f'{request.get_full_path()}:{request.user.pk}:{state}'.encode()
+        ).hexdigest()
+        etag = quote_etag(digest)
+        # CachedResponseMixin only serves entries stored under this ETag.
+        self.etag = etag
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+        # Only the ETag decides: Last-Modified misses deletions, counters and
+        # the viewer's own flags, so it is sent but never compared.
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Without it, clients may reuse a response by its age instead of asking.
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
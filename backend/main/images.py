@@ -0,0 +1,204 @@
+"""Validation and background re-encoding of uploaded pictures."""
+import base64
+import binascii
+import io
+import logging
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from main.storage import release, release_later
+
+logger = logging.getLogger(__name__)
+
+# Base64 characters decoded per step; a multiple of 4 keeps padding at the end.
+DECODE_CHUNK = 64 * 1024
+
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+_executor = None
+
+
+def sniff(header):
+    """Return the file extension matching the magic bytes in ``header``."""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
+def decode_image(data):
+    """Decode a ``data:image/...;base64,`` string into a validated spooled file."""
+    separator = ';base64,'
+    is_data_uri = isinstance(data, str) and data.startswith('data:image/')
+    start = data.find(separator) if is_data_uri else -1
+    if start < 0:
+        raise serializers.ValidationError('Некорректный формат изображения')
+    start += len(separator)
+    if (len(data) - start) // 4 * 3 > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(
+            f'Изображение больше {settings.IMAGE_MAX_UPLOAD_SIZE // 1024 // 1024} МБ'
+        )
+
+    file = tempfile.SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_SIZE)
+    try:
+        for position in range(start, len(data), DECODE_CHUNK):
+            file.write(base64.b64decode(data[position:position + DECODE_CHUNK], validate=True))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise serializers.ValidationError('Некорректный формат изображения')
+    file.seek(0)
+    extension = sniff(file.read(12))
+    file.seek(0)
+    if extension is None:
+        file.close()
+        raise serializers.ValidationError('Некорректный формат изображения')
+    return validate_image(File(file, name=f'{uuid.uuid4()}.{extension}'))
+
+
+def validate_image(file):
+    """Check that ``file`` holds a decodable picture within the size limits."""
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise serializers.ValidationError('Некорректный формат изображения')
+    finally:
+        file.seek(0)
+    if max(width, height) > settings.IMAGE_MAX_SIDE:
+        raise serializers.ValidationError(
+            f'Изображение больше {settings.IMAGE_MAX_SIDE}px по одной из сторон'
+        )
+    return file
+
+
+def encode(image, side):
+    image = image.copy()
+    image.thumbnail((side, side), Image.LANCZOS)
+    if settings.IMAGE_FORMAT == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha and settings.IMAGE_FORMAT != 'JPEG' else 'RGB')
+    image.info = {}
+    buffer = io.BytesIO()
+    image.save(buffer, settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def render(file, sizes):
+    """Return ``{size: ContentFile}`` for every size of the picture in ``file``."""
+    with file.open('rb'), Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        return {size: encode(image, side) for size, side in sizes.items()}
+
+
+def is_processed(name):
+    return name.endswith(f'_detail.{settings.IMAGE_FORMAT.lower()}')
+
+
+def process_image(label, pk, name):
+    """Re-encode ``label`` (``app.Model.field``) of row ``pk`` if it still holds ``name``."""
+    model_label, field = label.rsplit('.', 1)
+    model = apps.get_model(model_label)
+    variants_field = f'{field}_variants'
+    has_variants = any(f.name == variants_field for f in model._meta.fields)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or getattr(instance, field).name != name:
+        return
+    file = getattr(instance, field)
+    stem = PurePosixPath(name).stem
+    extension = settings.IMAGE_FORMAT.lower()
+    names = {
+        size: file.storage.save(f'{stem}_{size}.{extension}', content)
+        for size, content in render(file, settings.IMAGE_SIZES[label]).items()
+    }
+
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        current = instance and getattr(instance, field).name == name
+        if current:
+            setattr(instance, field, names.pop('detail'))
+            update_fields = [field, 'updated_at']
+            if has_variants:
+                setattr(instance, variants_field, names)
+                update_fields.append(variants_field)
+            instance.save(update_fields=update_fields)
+    if current:
+        # A request storing the same picture may not have committed yet, so
+        # the superseded upload waits out the grace period like any file.
+        release_later(name)
+    else:
+        release(*names.values())
+
+
+def _run(label, pk, name):
+    try:
+        process_image(label, pk, name)
+    except Exception:
+        logger.exception('Failed to process %s of %s #%s', name, label, pk)
+
+
+def _run_in_worker(*args):
+    try:
+        _run(*args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(settings.IMAGE_WORKERS, thread_name_prefix='images')
+    return _executor
+
+
+def schedule(instance, field):
+    """Process ``instance.field`` once the current transaction commits."""
+    label = f'{instance._meta.label}.{field}'
+    args = (label, instance.pk, getattr(instance, field).name)
+
+    def submit():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(_run_in_worker, *args)
+        else:
+            _run(*args)
+    transaction.on_commit(submit)
+
+
+class Base64ImageField(serializers.Field):
+    """Write-only image field accepting a base64 data URI."""
+
+    def to_internal_value(self, data):
+        return decode_image(data)
+
+
+class SizedImageField(serializers.ImageField):
+    """Image URL of the variant for ``size`` or the ``image_size`` context key."""
+
+    def __init__(self, size=None, **kwargs):
+        self.size = size
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        file = super().get_attribute(instance)
+        size = self.size or self.context.get('image_size', 'detail')
+        variant = getattr(instance, f'{self.source}_variants', {}).get(size)
+        if file and variant:
+            file = type(file)(instance, file.field, variant)
+        return file
@@ -0,0 +1,270 @@
+"""Per-endpoint query count and latency profiling, read by ``manage.py profile_endpoints``."""
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.response import Response
+
+ENABLED_KEY = 'profiling:enabled'
+GENERATION_KEY = 'profiling:generation'
+SLOT_KEY = 'profiling:process:{}'
+
+METRICS = ('total', 'db', 'queries', 'serialize', 'size')
+
+# Seconds between looks at the switch, and between copies to the cache.
+POLL_INTERVAL = 5
+FLUSH_INTERVAL = 10
+
+# Cache slots processes can claim for their histograms.
+MAX_PROCESSES = 64
+
+_current = ContextVar('profile', default=None)
+_lock = threading.Lock()
+_state = {'checked': float('-inf'), 'enabled': False, 'generation': None}
+_process = {'id': uuid.uuid4().hex, 'slot': None, 'flushed': float('-inf')}
+_windows = {}
+
+
+def get_cache():
+    return caches[settings.PROFILING_ALIAS]
+
+
+class Profile:
+    __slots__ = ('queries', 'db', 'serialize')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+
+def is_enabled():
+    now = time.monotonic()
+    if now - _state['checked'] >= POLL_INTERVAL:
+        _poll(now)
+    return _state['enabled']
+
+
+def _poll(now):
+    values = get_cache().get_many([ENABLED_KEY, GENERATION_KEY])
+    enabled = values.get(ENABLED_KEY)
+    generation = values.get(GENERATION_KEY)
+    with _lock:
+        if generation != _state['generation']:
+            _windows.clear()
+        _state.update(
+            checked=now,
+            enabled=settings.PROFILING if enabled is None else enabled,
+            generation=generation,
+        )
+
+
+def set_enabled(enabled):
+    get_cache().set(ENABLED_KEY, enabled, None)
+    _state['checked'] = float('-inf')
+
+
+def reset():
+    """Drop the histograms of every process."""
+    cache = get_cache()
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+    cache.delete_many([SLOT_KEY.format(slot) for slot in range(MAX_PROCESSES)])
+    _state['checked'] = float('-inf')
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.db += time.perf_counter() - started
+
+
+def install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install)
+
+
+def serialize(serializer):
+    """Return ``serializer.data``, counting the time outside queries as ``serialize``."""
+    profile = _current.get()
+    if profile is None:
+        return serializer.data
+    started, db = time.perf_counter(), profile.db
+    try:
+        return serializer.data
+    finally:
+        profile.serialize += time.perf_counter() - started - (profile.db - db)
+
+
+class ProfiledViewMixin:
+    """DRF's ``list`` and ``retrieve``, with the serializer data built by ``serialize()``."""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize(self.get_serializer(page, many=True)))
+        return Response(serialize(self.get_serializer(queryset, many=True)))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(serialize(self.get_serializer(self.get_object())))
+
+
+def get_endpoint(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = match.func
+    method = request.method.lower()
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return f'{view.__name__}.{method}'
+    # Viewsets map methods to actions; @api_view classes carry the function name.
+    actions = getattr(view, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+def bucket(value):
+    """Round to two significant digits: exact counts below 100, ~5% steps above."""
+    return float(f'{value:.2g}')
+
+
+def record(endpoint, values):
+    window = int(time.time() // settings.PROFILING_WINDOW)
+    with _lock:
+        histograms = _windows.setdefault(window, {}).setdefault(
+            endpoint, {metric: Counter() for metric in METRICS}
+        )
+        for metric, value in values.items():
+            histograms[metric][bucket(value)] += 1
+        for old in [key for key in _windows if key <= window - settings.PROFILING_WINDOWS]:
+            del _windows[old]
+    if time.monotonic() - _process['flushed'] >= FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """Copy this process's histograms to its cache slot."""
+    cache = get_cache()
+    timeout = settings.PROFILING_WINDOW * settings.PROFILING_WINDOWS
+    with _lock:
+        snapshot = {'owner': _process['id'], 'windows': {
+            window: {endpoint: {metric: dict(counts) for metric, counts in histograms.items()}
+                     for endpoint, histograms in endpoints.items()}
+            for window, endpoints in _windows.items()
+        }}
+        _process['flushed'] = time.monotonic()
+    slot = _process['slot']
+    if slot is not None:
+        current = cache.get(SLOT_KEY.format(slot))
+        if current is None or current['owner'] == _process['id']:
+            cache.set(SLOT_KEY.format(slot), snapshot, timeout)
+            return
+    for slot in range(MAX_PROCESSES):
+        if cache.add(SLOT_KEY.format(slot), snapshot, timeout):
+            _process['slot'] = slot
+            return
+
+
+def collect():
+    """Merge the histograms of all processes into ``{endpoint: {metric: Counter}}``."""
+    oldest = int(time.time() // settings.PROFILING_WINDOW) - settings.PROFILING_WINDOWS
+    snapshots = get_cache().get_many([SLOT_KEY.format(slot) for slot in range(MAX_PROCESSES)])
+    result = {}
+    for snapshot in snapshots.values():
+        for window, endpoints in snapshot['windows'].items():
+            if window <= oldest:
+                continue
+            for endpoint, histograms in endpoints.items():
+                merged = result.setdefault(endpoint, {metric: Counter() for metric in METRICS})
+                for metric, counts in histograms.items():
+                    merged[metric].update(counts)
+    return result
+
+
+def percentile(counts, fraction):
+    total = sum(counts.values())
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= fraction * total:
+            return value
+    return None
+
+
+def server_timing(profile, total):
+    return (
+        f'db;dur={profile.db * 1000:.1f};desc="{profile.queries} queries", '
+        f'serialize;dur={profile.serialize * 1000:.1f}, total;dur={total * 1000:.1f}'
+    )
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections opened before the middleware was loaded.
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+        profile, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+        profile, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, started)
+
+    def _start(self):
+        profile = Profile()
+        return profile, _current.set(profile), time.perf_counter()
+
+    def _finish(self, request, response, profile, started):
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(profile, total)
+        endpoint = get_endpoint(request)
+        if endpoint is not None:
+            values = {
+                'total': total * 1000,
+                'db': profile.db * 1000,
+                'queries': profile.queries,
+                'serialize': profile.serialize * 1000,
+            }
+            if not response.streaming:
+                values['size'] = len(response.content)
+            record(endpoint, values)
+        return response
@@ -0,0 +1,99 @@
+"""Response caching for anonymous read endpoints, invalidated by tag versions."""
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+HITS_KEY = 'response-cache:hits'
+MISSES_KEY = 'response-cache:misses'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    return f'response-cache:tag:{tag}'
+
+
+def _count(key):
+    cache = get_cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def build_key(request):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    auth = 'user' if request.user.is_authenticated else 'anon'
+    digest = hashlib.md5(f'{request.get_host()}{request.path}?{params}'.encode()).hexdigest()
+    return f'response-cache:{auth}:{digest}'
+
+
+def get_tag_versions(tags):
+    cache = get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate(*tags):
+    def bump():
+        get_cache().set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+    transaction.on_commit(bump)
+
+
+def get_stats():
+    cache = get_cache()
+    return {'hits': cache.get(HITS_KEY, 0), 'misses': cache.get(MISSES_KEY, 0)}
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+class CachedResponseMixin:
+    """Cache ``list``/``retrieve`` responses of anonymous requests under ``get_cache_tags``."""
+
+    cached_actions = ('list', 'retrieve')
+
+    def get_cache_tags(self, response):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+    def _cached(self, handler, request, *args, **kwargs):
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if not timeout or request.user.is_authenticated or self.action not in self.cached_actions:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = build_key(request)
+        etag = getattr(self, 'etag', None)
+        entry = cache.get(key)
+        if entry is not None and entry.get('etag') == etag and get_tag_versions(entry['tags']) == entry['tags']:
+            _count(HITS_KEY)
+            return Response(entry['data'], headers={'X-Cache': 'HIT'})
+
+        _count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            tags = get_tag_versions(self.get_cache_tags(response))
+            cache.set(key, {'data': response.data, 'tags': tags, 'etag': etag}, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -19,12 +19,18 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-au@2hvz%qgrwdz1eei$43&$froqwnb1p4#k-)%kiul+b@*qwg3'
+SECRET_KEY = os.getenv(
+    'SECRET_KEY', 'django-insecure-au@2hvz%qgrwdz1eei$43&$froqwnb1p4#k-)%kiul+b@*qwg3'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True').lower() in ('true', '1', 'yes')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+CSRF_TRUSTED_ORIGINS = [
+    origin.strip() for origin in os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',') if origin.strip()
+]
 
 # Application definition
 
@@ -45,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,12 +84,52 @@ WSGI_APPLICATION = 'main.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+if os.getenv('DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Keep connections between requests, but check them before reuse.
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    # psycopg's pool replaces persistent connections; Django forbids both.
+    if os.getenv('DB_POOL_MAX_SIZE'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE')),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # Take the write lock when a transaction starts, so concurrent
+            # toggles wait for each other instead of failing with "locked".
+            # timeout is SQLite's busy_timeout, in seconds.
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file database lets concurrent test threads share data.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+    # WAL lets readers run next to the single writer, and synchronous=NORMAL
+    # is safe with WAL while skipping an fsync per commit. WAL is written into
+    # the database file, so it is opt-in rather than applied to every copy.
+    if os.getenv('SQLITE_WAL', 'False').lower() in ('true', '1', 'yes'):
+        DATABASES['default']['OPTIONS']['init_command'] = 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL'
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -133,12 +180,23 @@ USE_I18N = True
 
 USE_TZ = True
 
-STATIC_URL = 'static/'
+# /static/ belongs to the frontend build behind the same nginx.
+STATIC_URL = 'backend_static/'
+
+STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = 'media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {'BACKEND': 'main.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Unreferenced media younger than this (seconds) is kept, see main.storage.release.
+MEDIA_GC_GRACE = 10 * 60
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "custom_user.CustomUser"
@@ -148,3 +206,80 @@ APPEND_SLASH = False
 MIN_COOKING_TIME = 1
 
 MAX_COOKING_TIME = 32000
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+SHORT_LINK_CACHE_SIZE = 10000
+
+SHORT_LINK_CACHE_TTL = 60 * 60
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+    }
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+
+# Seconds an anonymous GET response is kept; 0 disables the response cache.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60))
+
+# Seconds the counters of feed pages may lag behind in cached responses and
+# feed ETags; 0 keeps them exact, at the cost of every feed 304 and cache hit.
+FEED_COUNTERS_MAX_AGE = int(os.getenv('FEED_COUNTERS_MAX_AGE', 60))
+
+# Uploads are re-encoded to IMAGE_FORMAT; 'detail' replaces the stored file,
+# other sizes are kept next to it. Sizes are the longest side in pixels.
+IMAGE_SIZES = {
+    'ingredients_recipe.Recipe.image': {'detail': 1280, 'list': 480},
+    'custom_user.CustomUser.avatar': {'detail': 256},
+}
+
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP')
+
+IMAGE_QUALITY = 85
+
+IMAGE_MAX_SIDE = 8000
+
+# Matches client_max_body_size in infra/nginx.conf.
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Decoded uploads larger than this are spooled to a temporary file.
+IMAGE_SPOOL_SIZE = 1024 * 1024
+
+# 0 processes uploads synchronously after commit.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# 'auto' searches the in-process index on SQLite and the database elsewhere.
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND', 'auto')
+
+# Route the favorite, shopping cart and subscribe toggles to their async
+# views; worthwhile when served by an ASGI server (SERVER_MODE=asgi).
+ASYNC_TOGGLES = os.getenv(
+    'ASYNC_TOGGLES', str(os.getenv('SERVER_MODE') == 'asgi')
+).lower() in ('true', '1', 'yes')
+
+# Per-endpoint query and latency profiling, see main/profiling.py. Switched
+# at runtime with `manage.py profile_endpoints --enable/--disable`.
+PROFILING = os.getenv('PROFILING', 'False').lower() in ('true', '1', 'yes')
+
+PROFILING_ALIAS = 'default'
+
+# Histograms cover PROFILING_WINDOWS slots of PROFILING_WINDOW seconds.
+PROFILING_WINDOW = 60
+
+PROFILING_WINDOWS = 15
+
+# 'auto' searches recipes through the full-text index on SQLite and
+# PostgreSQL, 'naive' with icontains on every database.
+RECIPE_SEARCH_BACKEND = os.getenv('RECIPE_SEARCH_BACKEND', 'auto')
+
+# PostgreSQL text search configuration for recipe names, texts and ingredients.
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
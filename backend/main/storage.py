@@ -0,0 +1,120 @@
+"""Content-addressed media storage and collection of unreferenced files."""
+import hashlib
+import os
+import posixpath
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store files as ``<sha256>[_<label>].<ext>``."""
+
+    def save(self, name, content, max_length=None):
+        name = name or content.name
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        stem, extension = posixpath.splitext(filename)
+        label = stem.partition('_')[2]
+        name = posixpath.join(directory, digest.hexdigest() + (f'_{label}' if label else '') + extension.lower())
+        if self.exists(name):
+            # Refresh the mtime so a concurrent collection keeps the file.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+def image_fields():
+    """Yield ``(model, field, variant sizes)`` for every field in IMAGE_SIZES."""
+    for label, sizes in settings.IMAGE_SIZES.items():
+        model_label, field = label.rsplit('.', 1)
+        model = apps.get_model(model_label)
+        has_variants = any(f.name == f'{field}_variants' for f in model._meta.fields)
+        yield model, field, [size for size in sizes if size != 'detail'] if has_variants else []
+
+
+def image_names(instance, field):
+    """Names of the file in ``instance.field`` and of its variants."""
+    file = getattr(instance, field)
+    names = {file.name} if file else set()
+    names.update(getattr(instance, f'{field}_variants', {}).values())
+    return names
+
+
+def is_referenced(name):
+    for model, field, sizes in image_fields():
+        query = Q(**{field: name})
+        for size in sizes:
+            query |= Q(**{f'{field}_variants__{size}': name})
+        if model.objects.filter(query).exists():
+            return True
+    return False
+
+
+def referenced_names():
+    names = set()
+    for model, field, sizes in image_fields():
+        values = [field] + ([f'{field}_variants'] if sizes else [])
+        for row in model.objects.values_list(*values).iterator():
+            names.add(row[0])
+            if sizes:
+                names.update((row[1] or {}).values())
+    names.discard('')
+    names.discard(None)
+    return names
+
+
+def is_recent(storage, name):
+    return time.time() - storage.get_modified_time(name).timestamp() < settings.MEDIA_GC_GRACE
+
+
+def release(*names):
+    """Delete the unreferenced files among ``names`` older than MEDIA_GC_GRACE."""
+    deleted = []
+    for name in set(names) - {'', None}:
+        if (default_storage.exists(name) and not is_recent(default_storage, name)
+                and not is_referenced(name)):
+            default_storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+def release_on_commit(*names):
+    transaction.on_commit(lambda: release(*names))
+
+
+def _release_in_thread(*names):
+    try:
+        release(*names)
+    finally:
+        connection.close()
+
+
+def release_later(*names):
+    """Release ``names`` now and retry the recent ones once MEDIA_GC_GRACE has passed."""
+    kept = [
+        name for name in set(names) - set(release(*names)) - {'', None}
+        if default_storage.exists(name) and is_recent(default_storage, name)
+    ]
+    if kept:
+        # collect_media picks up what a restarted worker never retried.
+        timer = threading.Timer(settings.MEDIA_GC_GRACE, _release_in_thread, kept)
+        timer.daemon = True
+        timer.start()
+
+
+def walk(storage, path=''):
+    directories, files = storage.listdir(path)
+    for file in files:
+        yield posixpath.join(path, file)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
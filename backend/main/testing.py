@@ -0,0 +1,74 @@
+"""Fixtures shared by the tests of the apps."""
+import base64
+import io
+
+from django.contrib.auth import get_user_model
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient, normalize_name
+from relations.counters import increment
+
+User = get_user_model()
+
+
+def image_data(size, format='PNG', **params):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format, **params)
+    return f'data:image/{format.lower()};base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+PIXEL = image_data((1, 1))
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name=username,
+        last_name=username,
+    )
+
+
+def token_header(user):
+    return f'Token {Token.objects.get_or_create(user=user)[0].key}'
+
+
+def create_ingredients(count, measurement_unit='g'):
+    # bulk_create skips save(), which fills search_name.
+    names = [f'ingredient {i:02}' for i in range(count)]
+    return Ingredient.objects.bulk_create([
+        Ingredient(name=name, search_name=normalize_name(name), measurement_unit=measurement_unit)
+        for name in names
+    ])
+
+
+def create_recipes(author, count, ingredients=()):
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=author,
+            name=f'Recipe {i}',
+            image='recipe.png',
+            text='text',
+            cooking_time=10,
+        ) for i in range(count)
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+        for recipe in recipes for ingredient in ingredients
+    ])
+    increment(User, author.pk, 'recipes_count', count)
+    return recipes
+
+
+def recipe_data(ingredients, **fields):
+    """Body of a recipe create or update request; ``ingredients`` are (id, amount) pairs."""
+    return {
+        'ingredients': [{'id': pk, 'amount': amount} for pk, amount in ingredients],
+        'image': PIXEL,
+        'name': 'Пирог',
+        'text': 'text',
+        'cooking_time': 5,
+        **fields,
+    }
@@ -0,0 +1,365 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from custom_user.models import Subscription
+from ingredients_recipe.models import Ingredient, Recipe
+from main import bench, profiling
+from main.response_cache import get_stats
+from main.storage import _release_in_thread, image_names, release, walk
+from main.testing import PIXEL, create_recipes, create_user, image_data, recipe_data, token_header
+
+User = get_user_model()
+
+
+# Counters windows no test run crosses.
+@override_settings(FEED_COUNTERS_MAX_AGE=10 ** 9)
+class ResponseCacheTest(APITestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.recipes = create_recipes(self.author, 3)
+        cache.clear()
+
+    def test_anonymous_list_is_served_from_cache(self):
+        first = self.client.get('/api/recipes/', {'limit': 2})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # Only the conditional GET validators hit the database.
+        with self.assertNumQueries(2):
+            second = self.client.get('/api/recipes/', {'limit': 2})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+        other = self.client.get('/api/recipes/', {'limit': 1})
+        self.assertEqual(other['X-Cache'], 'MISS')
+        self.assertEqual(len(other.data['results']), 1)
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(self.author)
+        self.client.get('/api/recipes/')
+        response = self.client.get('/api/recipes/')
+        self.assertNotIn('X-Cache', response)
+
+    def test_recipe_write_invalidates_list_and_detail(self):
+        recipe = self.recipes[0]
+        self.client.get('/api/recipes/')
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        self.client.get(f'/api/recipes/{self.recipes[1].id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+
+        self.assertEqual(self.client.get('/api/recipes/')['X-Cache'], 'MISS')
+        detail = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['name'], 'Новое название')
+        self.assertEqual(self.client.get(f'/api/recipes/{self.recipes[1].id}/')['X-Cache'], 'HIT')
+
+    def test_author_change_invalidates_profile_and_recipes(self):
+        self.client.get(f'/api/users/{self.author.id}/')
+        self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(f'/api/users/{self.author.id}/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Пётр'
+            self.author.save()
+        profile = self.client.get(f'/api/users/{self.author.id}/')
+        self.assertEqual(profile['X-Cache'], 'MISS')
+        self.assertEqual(profile.data['first_name'], 'Пётр')
+        self.assertEqual(self.client.get(f'/api/recipes/{self.recipes[0].id}/')['X-Cache'], 'MISS')
+
+    def test_counter_writes_invalidate_details(self):
+        recipe = self.recipes[0]
+        reader = create_user('reader')
+        self.client.get('/api/recipes/')
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        self.client.get(f'/api/users/{self.author.id}/')
+
+        self.client.force_authenticate(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.client.force_authenticate(None)
+
+        # Feed pages keep their counters until the window turns.
+        feed = self.client.get('/api/recipes/')
+        self.assertEqual(feed['X-Cache'], 'HIT')
+        self.assertEqual({item['favorites_count'] for item in feed.data['results']}, {0})
+        with override_settings(FEED_COUNTERS_MAX_AGE=0):
+            feed = self.client.get('/api/recipes/')
+        self.assertEqual(feed['X-Cache'], 'MISS')
+        self.assertEqual({item['favorites_count'] for item in feed.data['results']}, {0, 1})
+        detail = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual((detail.data['favorites_count'], detail.data['author']['subscribers_count']), (1, 1))
+        profile = self.client.get(f'/api/users/{self.author.id}/')
+        self.assertEqual(profile.data['subscribers_count'], 1)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_zero_timeout_disables_cache(self):
+        self.client.get('/api/recipes/')
+        self.assertNotIn('X-Cache', self.client.get('/api/recipes/'))
+
+
+@override_settings(IMAGE_WORKERS=0, IMAGE_FORMAT='WEBP')
+class ImageProcessingTest(APITestCase):
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.timer = self.enterContext(mock.patch('threading.Timer'))
+        self.user = create_user('author')
+        self.ingredient = Ingredient.objects.create(name='Мука', measurement_unit='г')
+        self.client.force_authenticate(self.user)
+
+    def _create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/api/recipes/', recipe_data([(self.ingredient.id, 1)], image=image), format='json'
+            )
+
+    def test_recipe_image_is_reencoded_into_sizes(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        response = self._create(image_data((2000, 1000), 'JPEG', exif=exif.tobytes()))
+        self.assertEqual(response.status_code, 201)
+        original = Path(response.data['image']).name
+
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertTrue(recipe.image.name.endswith('_detail.webp'))
+        # A request storing the same bytes may still be in flight, so the
+        # upload is only released once the grace period has passed.
+        self.assertTrue(default_storage.exists(original))
+        self.timer.assert_called_once_with(settings.MEDIA_GC_GRACE, _release_in_thread, [original])
+        self.timer.return_value.start.assert_called_once_with()
+        past = time.time() - settings.MEDIA_GC_GRACE
+        os.utime(default_storage.path(original), (past, past))
+        release(original)
+        self.assertEqual(set(walk(default_storage)), image_names(recipe, 'image'))
+        with recipe.image.open('rb'), Image.open(recipe.image) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (1280, 640)))
+            self.assertFalse(image.getexif())
+        with default_storage.open(recipe.image_variants['list']) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (480, 240))
+
+        self.client.force_authenticate(None)
+        feed = self.client.get('/api/recipes/').data['results'][0]
+        self.assertTrue(feed['image'].endswith('_list.webp'))
+        detail = self.client.get(f'/api/recipes/{recipe.id}/').data
+        self.assertTrue(detail['image'].endswith('_detail.webp'))
+
+    def test_invalid_images_are_rejected(self):
+        garbage = 'data:image/png;base64,' + base64.b64encode(b'not an image').decode()
+        self.assertEqual(self._create(garbage).status_code, 400)
+        with override_settings(IMAGE_MAX_SIDE=10):
+            self.assertEqual(self._create(image_data((20, 5))).status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_decoder_sniffs_type_and_enforces_limits(self):
+        jpeg = image_data((10, 10), 'JPEG').replace('image/jpeg', 'image/png')
+        response = self._create(jpeg)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['image'].endswith('.jpg'))
+
+        with override_settings(IMAGE_MAX_UPLOAD_SIZE=100), mock.patch('base64.b64decode') as decode:
+            response = self._create(image_data((100, 100)))
+        self.assertEqual(response.status_code, 400)
+        decode.assert_not_called()
+
+        self.assertEqual(self._create(PIXEL[:-8] + '\n' + PIXEL[-8:]).status_code, 400)
+        self.assertEqual(self._create('data:text/plain;base64,aGVsbG8=').status_code, 400)
+
+    def test_avatar_is_reencoded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/users/me/avatar/', {'avatar': image_data((600, 600))}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        with self.user.avatar.open('rb'), Image.open(self.user.avatar) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (256, 256)))
+
+    def test_process_images_command(self):
+        recipe = create_recipes(self.user, 1)[0]
+        recipe.image.save('legacy.png', ContentFile(base64.b64decode(PIXEL.split(',')[1])))
+
+        call_command('process_images', stdout=io.StringIO())
+
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image.name.endswith('_detail.webp'))
+        self.assertIn('list', recipe.image_variants)
+
+
+@override_settings(IMAGE_WORKERS=0, MEDIA_GC_GRACE=0)
+class MediaStorageTest(APITestCase):
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.user = create_user('author')
+        self.ingredient = Ingredient.objects.create(name='Мука', measurement_unit='г')
+        self.client.force_authenticate(self.user)
+
+    def _save(self, image, recipe=None):
+        method = self.client.patch if recipe else self.client.post
+        url = f'/api/recipes/{recipe}/' if recipe else '/api/recipes/'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = method(url, recipe_data([(self.ingredient.id, 1)], image=image), format='json')
+        self.assertIn(response.status_code, (200, 201))
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def _files(self):
+        return set(walk(default_storage))
+
+    def test_names_are_content_hashes(self):
+        first = default_storage.save('photo.png', ContentFile(b'same'))
+        self.assertEqual(default_storage.save('other_list.PNG', ContentFile(b'same')), first.replace('.png', '_list.png'))
+        self.assertEqual(default_storage.save('again.png', ContentFile(b'same')), first)
+        self.assertEqual(first, hashlib.sha256(b'same').hexdigest() + '.png')
+
+    def test_identical_uploads_share_files_until_unreferenced(self):
+        image = image_data((600, 300))
+        first = self._save(image)
+        second = self._save(image)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self._files(), image_names(first, 'image'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self._files(), image_names(second, 'image'))
+
+        second = self._save(image_data((300, 600)), recipe=second.id)
+        self.assertEqual(self._files(), image_names(second, 'image'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self._files(), set())
+
+    def test_avatar_delete_releases_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/users/me/avatar/', {'avatar': image_data((50, 50))}, format='json')
+        self.assertEqual(len(self._files()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/users/me/avatar/').status_code, 204)
+        self.assertEqual(self._files(), set())
+
+    def test_collect_media_removes_orphans(self):
+        recipe = self._save(image_data((100, 100)))
+        orphan = default_storage.save('orphan.png', ContentFile(b'orphan'))
+
+        out = io.StringIO()
+        call_command('collect_media', '--dry-run', stdout=out)
+        self.assertIn('Would delete 1 files', out.getvalue())
+        with override_settings(MEDIA_GC_GRACE=60):
+            call_command('collect_media', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command('collect_media', stdout=io.StringIO())
+        self.assertEqual(self._files(), image_names(recipe, 'image'))
+
+
+class DatabaseSettingsTest(APITestCase):
+
+    def test_sqlite_connection_is_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        wal = 'init_command' in connection.settings_dict['OPTIONS']
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0] == 'wal', wal)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1 if wal else 2)
+
+
+class ProfilingTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        profiling.set_enabled(True)
+        self.addCleanup(profiling.set_enabled, False)
+        self.user = create_user('reader')
+        author = create_user('author')
+        create_recipes(author, 3)
+        Subscription.objects.create(from_source=self.user, to=author)
+
+    def test_server_timing_reports_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(context.captured_queries)} queries"', timing)
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_histograms_per_endpoint(self):
+        self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/')
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+        self.client.get('/api/users/subscriptions/')
+        self.client.post(f'/api/recipes/{Recipe.objects.first().id}/favorite/')
+
+        profiling.flush()
+        histograms = profiling.collect()
+        self.assertEqual(
+            set(histograms), {'RecipeViewSet.list', 'CustomUserViewSet.subscriptions', 'favorite.post'}
+        )
+        recipes = histograms['RecipeViewSet.list']
+        self.assertEqual(sum(recipes['total'].values()), 2)
+        self.assertEqual(sum(recipes['serialize'].values()), 2)
+        # The second request is a cache hit: nothing to serialize.
+        self.assertGreater(max(recipes['serialize']), 0)
+        self.assertGreater(max(histograms['CustomUserViewSet.subscriptions']['serialize']), 0)
+        self.assertGreater(profiling.percentile(recipes['size'], 0.5), 0)
+
+        out = io.StringIO()
+        call_command('profile_endpoints', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('endpoint'))
+        self.assertTrue(any(line.startswith('CustomUserViewSet.subscriptions') for line in lines))
+
+    def test_switched_off_at_runtime(self):
+        call_command('profile_endpoints', '--disable', stdout=io.StringIO())
+        response = self.client.get('/api/recipes/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.collect(), {})
+
+    def test_bucket_keeps_two_significant_digits(self):
+        self.assertEqual([profiling.bucket(value) for value in (0, 7, 99, 1234.5)], [0, 7, 99, 1200])
+
+
+class BenchHelpersTest(APITestCase):
+
+    def test_rolled_back_discards_writes(self):
+        with bench.rolled_back():
+            create_user('bench-user')
+            self.assertTrue(User.objects.filter(username='bench-user').exists())
+        self.assertFalse(User.objects.filter(username='bench-user').exists())
+
+    def test_describe(self):
+        timings = [float(value) for value in range(1, 101)]
+        self.assertEqual(bench.percentile(timings, 0.95), 95)
+        self.assertEqual(bench.percentile([3.0], 0.5), 3)
+        self.assertEqual(bench.describe(timings, 1), 'mean 50.5 ms, p50 50.0 ms, p95 95.0 ms, max 100.0 ms')
+        self.assertEqual(len(bench.measure(sorted, [(timings,)] * 3)), 3)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RelationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "relations"
+
+    def ready(self):
+        import relations.signals  # noqa: F401
@@ -0,0 +1,41 @@
+"""Async favorite and shopping cart toggles, routed when ``ASYNC_TOGGLES`` is on."""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+
+from ingredients_recipe.models import Recipe
+from main.async_api import async_api_view, respond
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
+from relations.serializers import SHORT_RECIPE_FIELDS, ShortRecipeSerializer
+from relations.shopping_list import add_recipe, remove_recipe
+from relations.views import add_relation, remove_relation
+
+
+async def toggle(request, pk, model, counter, added=None, removed=None):
+    recipe = await aget_object_or_404(Recipe.objects.only(*SHORT_RECIPE_FIELDS), pk=pk)
+    user = request.user
+
+    if not user.is_authenticated:
+        return respond(status=401)
+
+    if request.method == 'POST':
+        if not await sync_to_async(add_relation)(model, user, recipe, counter, added):
+            return respond(status=400)
+        serializer = ShortRecipeSerializer(recipe, context={'request': request})
+        return respond(serializer.data, status=201)
+
+    if not await sync_to_async(remove_relation)(model, user, recipe, counter, removed):
+        return respond(status=400)
+    return respond(status=204)
+
+
+@async_api_view(['post', 'delete'])
+async def favorite(request, pk=None):
+    return await toggle(request, pk, FavoriteUserRecipe, 'favorites_count')
+
+
+@async_api_view(['post', 'delete'])
+async def shopping_cart(request, pk=None):
+    return await toggle(
+        request, pk, ShoppingCartUserRecipe, 'in_carts_count',
+        added=add_recipe, removed=remove_recipe
+    )
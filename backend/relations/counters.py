@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from custom_user.models import Subscription
+from ingredients_recipe.models import Recipe
+from main.response_cache import invalidate
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
+
+User = get_user_model()
+
+
+def count_of(model, field):
+    """Correlated COUNT(*) of ``model`` rows whose ``field`` is the outer row."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': lambda: count_of(FavoriteUserRecipe, 'recipe'),
+        'in_carts_count': lambda: count_of(ShoppingCartUserRecipe, 'recipe'),
+    },
+    User: {
+        'subscribers_count': lambda: count_of(Subscription, 'to'),
+        'recipes_count': lambda: count_of(Recipe, 'author'),
+    },
+}
+
+
+# Cached details showing the counters of a row, see main.response_cache. Feed
+# pages are left to expire, see FEED_COUNTERS_MAX_AGE.
+CACHE_TAGS = {
+    Recipe: lambda pk: [f'recipe:{pk}'],
+    User: lambda pk: [f'user:{pk}'],
+}
+
+
+def increment(model, pk, field, delta=1):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+    invalidate(*CACHE_TAGS[model](pk))
+
+
+def reconcile(model, field):
+    """Recount ``field`` for every row of ``model``, return the number of rows fixed."""
+    drifted = list(model.objects.annotate(
+        actual=COUNTERS[model][field]()
+    ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+    if drifted:
+        model.objects.update(**{field: COUNTERS[model][field]()})
+        invalidate(*{tag for pk in drifted for tag in CACHE_TAGS[model](pk)})
+    return len(drifted)
@@ -0,0 +1,279 @@
+"""Scripted API scenarios with a JSON report, for comparing runs."""
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients_recipe.models import Ingredient, Recipe
+from main.bench import percentile, rolled_back
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
+
+User = get_user_model()
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def feed(rng, data):
+    pages = max(1, len(data['recipes']) // 6)
+    yield 'GET', f'/api/recipes/?page={rng.randint(1, min(pages, 50))}&limit=6', None, 200
+
+
+def feed_by_author(rng, data):
+    yield 'GET', f'/api/recipes/?author={rng.choice(data["authors"])}&limit=6', None, 200
+
+
+def feed_favorited(rng, data):
+    yield 'GET', '/api/recipes/?is_favorited=1&limit=6', rng.choice(data['users']), 200
+
+
+def feed_in_cart(rng, data):
+    yield 'GET', '/api/recipes/?is_in_shopping_cart=1&limit=6', rng.choice(data['users']), 200
+
+
+def subscriptions(rng, data):
+    yield 'GET', '/api/users/subscriptions/?limit=6&recipes_limit=3', rng.choice(data['users']), 200
+
+
+def shopping_list(rng, data):
+    yield 'GET', '/api/recipes/download_shopping_cart/', rng.choice(data['cart_users']), 200
+
+
+def toggles(rng, data):
+    user = rng.choice(data['users'])
+    recipe = rng.choice(data['recipes'])
+    while recipe in data['favorites'][user]:
+        recipe = rng.choice(data['recipes'])
+    for method, expected in (('POST', 201), ('DELETE', 204)):
+        yield method, f'/api/recipes/{recipe}/favorite/', user, expected
+
+
+def autocomplete(rng, data):
+    name = rng.choice(data['ingredients'])
+    yield 'GET', f'/api/ingredients/?name={name[:rng.randint(1, 3)]}', None, 200
+
+
+SCENARIOS = {scenario.__name__: scenario for scenario in (
+    feed, feed_by_author, feed_favorited, feed_in_cart, subscriptions, shopping_list, toggles, autocomplete,
+)}
+
+
+def summarize(samples, elapsed):
+    """``samples`` are ``(seconds, queries or None, ok)`` tuples."""
+    timings = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(not ok for _, _, ok in samples),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(timings), 2),
+            'p50': round(percentile(timings, 0.5), 2),
+            'p95': round(percentile(timings, 0.95), 2),
+            'p99': round(percentile(timings, 0.99), 2),
+            'max': round(timings[-1], 2),
+        },
+        'queries': {
+            'mean': round(statistics.fmean(queries), 1),
+            'p50': statistics.median_low(queries),
+            'max': max(queries),
+        } if queries else None,
+    }
+
+
+def change(old, new):
+    if not old or new is None:
+        return f'{new}'
+    return f'{old:g} -> {new:g} ({(new - old) / old:+.0%})'
+
+
+class ClientTransport:
+    name = 'test client'
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.client = APIClient()
+
+    def __call__(self, method, path, user):
+        token = self.tokens.get(user)
+        credentials = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic(method, path, **credentials)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, len(queries.captured_queries)
+
+
+class HttpTransport:
+
+    def __init__(self, url, tokens):
+        self.name = url
+        self.url = urlsplit(url)
+        self.tokens = tokens
+        self.local = threading.local()
+
+    def __call__(self, method, path, user):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection(self.url.netloc, timeout=60)
+        token = self.tokens.get(user)
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        try:
+            self.local.connection.request(method, quote(path, safe='/?=&'), headers=headers)
+            response = self.local.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.local.connection.close()
+            return None, None
+        match = QUERIES.search(response.getheader('Server-Timing', ''))
+        return response.status, match and int(match[1])
+
+
+class Command(BaseCommand):
+    help = 'Run scripted API scenarios and report throughput, latency and query counts as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Scenario to run, repeatable; all by default.')
+        parser.add_argument('--requests', type=int, default=200, help='Iterations per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unrecorded iterations per scenario.')
+        parser.add_argument('--users', type=int, default=50, help='Distinct users acting in scenarios.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--url', help='Run against a server, e.g. http://127.0.0.1:8000.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads with --url.')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+        parser.add_argument('--compare', help='Print changes against an earlier report.')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            report = self._run(options)
+        else:
+            with rolled_back():
+                report = self._run(options)
+
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self._compare(json.load(file), report)
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        data = self._sample(rng, options['users'])
+        try:
+            return self._measure(options, rng, data)
+        finally:
+            # A --url run commits its tokens; a rolled back run loses them anyway.
+            Token.objects.filter(key__in=data['new_tokens']).delete()
+
+    def _measure(self, options, rng, data):
+        if options['url']:
+            transport = HttpTransport(options['url'], data['tokens'])
+        else:
+            transport = ClientTransport(data['tokens'])
+        scenarios = {}
+        for name in options['scenarios'] or SCENARIOS:
+            scenario = SCENARIOS[name]
+            self._execute(transport, scenario, rng, data, options['warmup'], 1)
+            started = time.perf_counter()
+            samples = self._execute(
+                transport, scenario, rng, data, options['requests'],
+                options['concurrency'] if options['url'] else 1
+            )
+            scenarios[name] = summarize(samples, time.perf_counter() - started)
+        return {
+            'run': {
+                'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'transport': transport.name,
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'] if options['url'] else 1,
+                'data': {
+                    'users': User.objects.count(),
+                    'recipes': len(data['recipes']),
+                    'ingredients': len(data['ingredients']),
+                    'favorites': FavoriteUserRecipe.objects.count(),
+                    'cart items': ShoppingCartUserRecipe.objects.count(),
+                },
+            },
+            'scenarios': scenarios,
+        }
+
+    def _sample(self, rng, users):
+        recipes = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        ingredients = list(Ingredient.objects.order_by('pk').values_list('name', flat=True))
+        if not recipes or not ingredients:
+            raise CommandError('No recipes or ingredients, run seed_data first.')
+        active = list(User.objects.filter(favorites__isnull=False).distinct().order_by('pk'))
+        active = rng.sample(active, min(users, len(active))) or list(User.objects.order_by('pk')[:users])
+        cart_users = [user for user in active if user.shopping_cart.exists()] or active
+        tokens, new_tokens = {}, []
+        for user in active:
+            token, created = Token.objects.get_or_create(user=user)
+            tokens[user.pk] = token.key
+            if created:
+                new_tokens.append(token.key)
+        return {
+            'recipes': recipes,
+            'ingredients': ingredients,
+            'authors': list(Recipe.objects.order_by('author').values_list('author', flat=True).distinct()),
+            'users': [user.pk for user in active],
+            'cart_users': [user.pk for user in cart_users],
+            'favorites': {user.pk: set(user.favorites.values_list('recipe', flat=True)) for user in active},
+            'tokens': tokens,
+            'new_tokens': new_tokens,
+        }
+
+    def _execute(self, transport, scenario, rng, data, iterations, concurrency):
+        plans = [list(scenario(rng, data)) for _ in range(iterations)]
+        samples, lock = [], threading.Lock()
+
+        def worker(plans):
+            local = []
+            for plan in plans:
+                for method, path, user, expected in plan:
+                    started = time.perf_counter()
+                    status, queries = transport(method, path, user)
+                    local.append((time.perf_counter() - started, queries, status == expected))
+            with lock:
+                samples.extend(local)
+
+        if concurrency == 1:
+            worker(plans)
+            return samples
+        threads = [threading.Thread(target=worker, args=(plans[index::concurrency],))
+                   for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    def _compare(self, before, after):
+        self.stderr.write(f'{"scenario":<16} {"p95 ms":>24} {"req/s":>24} {"max queries":>16}')
+        for name, current in after['scenarios'].items():
+            previous = before['scenarios'].get(name)
+            if previous is None:
+                continue
+            self.stderr.write(
+                f'{name:<16} '
+                f'{change(previous["latency_ms"]["p95"], current["latency_ms"]["p95"]):>24} '
+                f'{change(previous["throughput"], current["throughput"]):>24} '
+                f'{change((previous["queries"] or {}).get("max"), (current["queries"] or {}).get("max")):>16}'
+            )
@@ -0,0 +1,132 @@
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient
+from main.bench import describe
+
+User = get_user_model()
+
+MODES = {'sync': 'False', 'async': 'True'}
+
+
+class Command(BaseCommand):
+    help = ('Toggle favorites, carts and subscriptions over HTTP against uvicorn, '
+            'once with the DRF views and once with the async views.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32, help='Concurrent connections.')
+        parser.add_argument('--toggles', type=int, default=50, help='POST+DELETE pairs per client.')
+        parser.add_argument('--authors', type=int, default=10)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        # The server runs in another process, so the data is committed and
+        # removed afterwards instead of being rolled back.
+        authors = User.objects.bulk_create([
+            User(username=f'bench-toggle-author-{i}', email=f'bench-toggle-author-{i}@example.com')
+            for i in range(options['authors'])
+        ])
+        clients = User.objects.bulk_create([
+            User(username=f'bench-toggle-{i}', email=f'bench-toggle-{i}@example.com')
+            for i in range(options['clients'])
+        ])
+        tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in clients])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Bench {i}', image='bench.png', text='text', cooking_time=1)
+            for i, author in enumerate(authors * 2)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in recipes for ingredient in Ingredient.objects.all()[:3]
+        ])
+        targets = [f'/api/recipes/{recipe.pk}/{action}/'
+                   for recipe in recipes for action in ('favorite', 'shopping_cart')]
+        targets += [f'/api/users/{author.pk}/subscribe/' for author in authors]
+        try:
+            for mode in options['modes']:
+                with self._server(mode, options['port']):
+                    self._run(mode, options['port'], [token.key for token in tokens], targets, options['toggles'])
+        finally:
+            Recipe.objects.filter(author__in=authors).delete()
+            User.objects.filter(username__startswith='bench-toggle-').delete()
+
+    @contextmanager
+    def _server(self, mode, port):
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main.asgi:application', '--port', str(port),
+             '--log-level', 'warning', '--no-access-log'],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'ASYNC_TOGGLES': MODES[mode], 'ALLOWED_HOSTS': '127.0.0.1'},
+        )
+        try:
+            self._wait_for(port, process)
+            yield
+        finally:
+            process.terminate()
+            process.wait()
+
+    def _wait_for(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f'uvicorn exited with code {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f'uvicorn did not start on port {port}')
+
+    def _run(self, mode, port, tokens, targets, toggles):
+        timings, failures, lock = [], [], threading.Lock()
+        barrier = threading.Barrier(len(tokens))
+
+        def worker(token):
+            rng = random.Random(token)
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            headers = {'Authorization': f'Token {token}'}
+            local, failed = [], 0
+            barrier.wait()
+            for _ in range(toggles):
+                path = rng.choice(targets)
+                for method, expected in (('POST', 201), ('DELETE', 204)):
+                    started = time.perf_counter()
+                    try:
+                        connection.request(method, path, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                        failed += response.status != expected
+                    except (OSError, http.client.HTTPException):
+                        failed += 1
+                        connection.close()
+                    local.append((time.perf_counter() - started) * 1000)
+            connection.close()
+            with lock:
+                timings.extend(local)
+                failures.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(token,)) for token in tokens]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{mode:>5}, {len(tokens)} clients: {len(timings)} toggles in {elapsed:.2f} s, '
+            f'{len(timings) / elapsed:.0f} req/s, {describe(timings, 1)}, {sum(failures)} failed'
+        )
@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ingredients_recipe.models import Recipe
+from main.bench import describe
+from relations.views import favorite
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Toggle favorites from concurrent threads through relations.views.favorite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--toggles', type=int, default=200, help='POST+DELETE pairs per thread.')
+        parser.add_argument('--recipes', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Worker threads use their own connections, so the data is committed
+        # and removed afterwards instead of being rolled back.
+        author = User.objects.create(username='bench-fav-author', email='bench-fav-author@example.com')
+        users = User.objects.bulk_create([
+            User(username=f'bench-fav-{i}', email=f'bench-fav-{i}@example.com')
+            for i in range(options['threads'])
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Bench {i}', image='bench.png', text='text', cooking_time=1)
+            for i in range(options['recipes'])
+        ])
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                self._run(users, [recipe.pk for recipe in recipes], options['toggles'])
+        finally:
+            Recipe.objects.filter(author=author).delete()
+            User.objects.filter(username__startswith='bench-fav-').delete()
+
+    def _run(self, users, recipe_ids, toggles):
+        factory = APIRequestFactory()
+        timings, failures, lock = [], [], threading.Lock()
+
+        def worker(user):
+            rng = random.Random(user.pk)
+            local, failed = [], 0
+            try:
+                for _ in range(toggles):
+                    pk = rng.choice(recipe_ids)
+                    for method, expected in (('post', 201), ('delete', 204)):
+                        request = getattr(factory, method)(f'/api/recipes/{pk}/favorite/')
+                        force_authenticate(request, user)
+                        started = time.perf_counter()
+                        try:
+                            response = favorite(request, pk=pk)
+                        except Exception:
+                            response = None
+                        local.append((time.perf_counter() - started) * 1000)
+                        failed += response is None or response.status_code != expected
+            finally:
+                connection.close()
+            with lock:
+                timings.extend(local)
+                failures.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        settings = connection.settings_dict
+        self.stdout.write(
+            f'{connection.vendor}, {len(users)} threads: {len(timings)} writes in {elapsed:.2f} s, '
+            f'{len(timings) / elapsed:.0f} writes/s, {describe(timings, 1)}, {sum(failures)} failed'
+        )
+        self.stdout.write(f'options: {settings["OPTIONS"]}, CONN_MAX_AGE={settings["CONN_MAX_AGE"]}')
@@ -0,0 +1,66 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from ingredients_recipe.models import Recipe
+from main.bench import rolled_back
+from relations.short_links import cache, get_or_create_code
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Load-test the /s/<code>/ redirect with a cold and a warm link cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(**options)
+
+    def _run(self, links, requests, threads, **options):
+        author, _ = User.objects.get_or_create(
+            username='bench-author', defaults={'email': 'bench-author@example.com'}
+        )
+        recipes = Recipe.objects.bulk_create([
+            Recipe(author=author, name=f'Bench {i}', image='bench.png', text='text', cooking_time=1)
+            for i in range(links)
+        ])
+        codes = [get_or_create_code(recipe.pk) for recipe in recipes]
+        urls = [f'/s/{random.choice(codes)}/' for _ in range(requests)]
+
+        cache.clear()
+        client = Client()
+        started = time.perf_counter()
+        for code in codes:
+            client.get(f'/s/{code}/')
+        self._report('cold (DB)', links, time.perf_counter() - started)
+
+        chunks = [urls[i::threads] for i in range(threads)]
+        failures = []
+
+        def worker(chunk):
+            worker_client = Client()
+            for url in chunk:
+                if worker_client.get(url).status_code != 302:
+                    failures.append(url)
+
+        workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self._report(f'warm, {threads} threads', requests, time.perf_counter() - started)
+        if failures:
+            self.stdout.write(self.style.ERROR(f'{len(failures)} requests did not redirect'))
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(f'{label:>18}: {count} requests in {elapsed:.2f} s, {count / elapsed:.0f} req/s')
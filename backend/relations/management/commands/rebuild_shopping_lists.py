@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from relations.models import ShoppingListItem
+from relations.shopping_list import compute_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized shopping lists from carts and report drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report drift, do not rewrite the table.'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        expected = compute_shopping_lists()
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        drift = sorted(
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        )
+        for user_id, ingredient_id in drift:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored.get((user_id, ingredient_id))}, '
+                f'expected {expected.get((user_id, ingredient_id))}'
+            )
+
+        if not options['dry_run']:
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create([
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+                for (user_id, ingredient_id), amount in expected.items()
+            ], batch_size=1000)
+
+        style = self.style.WARNING if drift else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{len(drift)} drifted rows out of {len(expected)} expected'
+            + ('' if options['dry_run'] else ', table rebuilt.')
+        ))
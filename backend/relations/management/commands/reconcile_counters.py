@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from relations.counters import COUNTERS, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the denormalized favorites, cart, subscriber and recipe counters.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, fields in COUNTERS.items():
+            for field in fields:
+                drifted = reconcile(model, field)
+                style = self.style.WARNING if drifted else self.style.SUCCESS
+                self.stdout.write(style(
+                    f'{model._meta.label}.{field}: {drifted} rows fixed'
+                ))
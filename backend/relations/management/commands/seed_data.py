@@ -0,0 +1,155 @@
+import random
+from bisect import bisect
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from custom_user.models import Subscription
+from ingredients_recipe import fulltext, snapshots
+from ingredients_recipe.models import Ingredient, Recipe, RecipeIngredient
+from main.response_cache import invalidate
+from relations.counters import COUNTERS, reconcile
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe, ShoppingListItem
+from relations.shopping_list import compute_shopping_lists
+
+User = get_user_model()
+
+DEFAULT_INGREDIENTS = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+AMOUNTS = (1, 2, 3, 5, 10, 50, 100, 150, 200, 250, 300, 500)
+BATCH_SIZE = 2000
+
+
+class Zipf:
+    """Draw items of ``population`` with weight 1 / rank ** ``alpha``."""
+
+    def __init__(self, rng, population, alpha):
+        self.rng = rng
+        self.population = list(population)
+        self.cumulative = list(accumulate(1 / rank ** alpha for rank in range(1, len(self.population) + 1)))
+
+    def one(self):
+        return self.population[bisect(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+    def distinct(self, count):
+        """Up to ``count`` different items; rare ones are not chased forever."""
+        chosen = {}
+        for _ in range(count * 10):
+            if len(chosen) >= count:
+                break
+            item = self.one()
+            chosen.setdefault(item.pk, item)
+        return list(chosen.values())
+
+
+class Command(BaseCommand):
+    help = ('Generate users, recipes, favorites, carts and subscriptions with '
+            'power-law popularity for benchmarks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--favorites', type=float, default=20, help='Mean favorites per user.')
+        parser.add_argument('--carts', type=float, default=4, help='Mean cart size per user.')
+        parser.add_argument('--subscriptions', type=float, default=8, help='Mean subscriptions per user.')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Zipf exponent of popularity and Pareto shape of activity, above 1.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='seed-', help='Username prefix of generated users.')
+        parser.add_argument('--ingredients', default=str(DEFAULT_INGREDIENTS),
+                            help='Loaded first when the ingredient table is empty.')
+        parser.add_argument('--clear', action='store_true', help='Only remove previously generated data.')
+
+    def handle(self, *args, **options):
+        if options['alpha'] <= 1:
+            raise CommandError('--alpha must be above 1.')
+        with transaction.atomic():
+            cleared = User.objects.filter(username__startswith=options['prefix']).delete()[0]
+            if options['clear']:
+                self._finish([])
+                self.stdout.write(self.style.SUCCESS(f'Removed {cleared} rows.'))
+                return
+            if not Ingredient.objects.exists():
+                call_command('load_ingredients', options['ingredients'], stdout=self.stdout)
+            people, counts = self._seed(random.Random(options['seed']), **options)
+            self._finish([user.pk for user in people])
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
+
+    def _seed(self, rng, users, recipes, favorites, carts, subscriptions, alpha, prefix, **options):
+        password = make_password('password')
+        people = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                 first_name='Seed', last_name=str(i), password=password)
+            for i in range(users)
+        ], batch_size=BATCH_SIZE)
+        Token.objects.bulk_create(
+            [Token(user=user, key=Token.generate_key()) for user in people], batch_size=BATCH_SIZE
+        )
+
+        # A few prolific authors write most recipes and gather most subscribers.
+        authors = Zipf(rng, rng.sample(people, len(people)), alpha)
+        dishes = Recipe.objects.bulk_create([
+            Recipe(author=authors.one(), name=f'Seed recipe {i}', image='recipe.png',
+                   text='Seeded for benchmarks.', cooking_time=rng.randint(5, 180))
+            for i in range(recipes)
+        ], batch_size=BATCH_SIZE)
+
+        pantry = list(Ingredient.objects.only('pk').order_by('pk'))
+        rng.shuffle(pantry)
+        ingredients = Zipf(rng, pantry, alpha)
+        links = [
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=rng.choice(AMOUNTS))
+            for recipe in dishes
+            for ingredient in ingredients.distinct(round(rng.triangular(2, 16, 7)))
+        ]
+        RecipeIngredient.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+        popular = Zipf(rng, rng.sample(dishes, len(dishes)), alpha)
+        favorite_rows, cart_rows, subscription_rows = [], [], []
+        for user in people:
+            favorite_rows += [FavoriteUserRecipe(user=user, recipe=recipe)
+                              for recipe in popular.distinct(self._activity(rng, favorites, alpha))]
+            cart_rows += [ShoppingCartUserRecipe(user=user, recipe=recipe)
+                          for recipe in popular.distinct(self._activity(rng, carts, alpha))]
+            subscription_rows += [Subscription(from_source=user, to=author)
+                                  for author in authors.distinct(self._activity(rng, subscriptions, alpha))
+                                  if author != user]
+        FavoriteUserRecipe.objects.bulk_create(favorite_rows, batch_size=BATCH_SIZE)
+        ShoppingCartUserRecipe.objects.bulk_create(cart_rows, batch_size=BATCH_SIZE)
+        Subscription.objects.bulk_create(subscription_rows, batch_size=BATCH_SIZE)
+        return people, {
+            'users': len(people),
+            'recipes': len(dishes),
+            'recipe ingredients': len(links),
+            'favorites': len(favorite_rows),
+            'cart items': len(cart_rows),
+            'subscriptions': len(subscription_rows),
+        }
+
+    @staticmethod
+    def _activity(rng, mean, alpha):
+        """Pareto-distributed count whose expectation is about ``mean``."""
+        return round(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha)
+
+    def _finish(self, user_ids):
+        # bulk_create bypasses the counters, shopping lists, snapshots, search
+        # index and cache signals.
+        user_ids = set(user_ids)
+        for model, fields in COUNTERS.items():
+            for field in fields:
+                reconcile(model, field)
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+            for (user_id, ingredient_id), amount in compute_shopping_lists().items()
+            if user_id in user_ids
+        ], batch_size=BATCH_SIZE)
+        snapshots.rebuild()
+        fulltext.rebuild()
+        invalidate('recipes', 'ingredients')
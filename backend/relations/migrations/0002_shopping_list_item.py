@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:36
+
+import django.db.models.deletion
+import relations.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipeIngredient = apps.get_model('ingredients_recipe', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('relations', 'ShoppingListItem')
+    rows = RecipeIngredient.objects.values(
+        'recipe__shopping_cart_recipe__user', 'ingredient'
+    ).filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).annotate(total=Sum('amount'))
+    ShoppingListItem.objects.bulk_create([
+        ShoppingListItem(
+            user_id=row['recipe__shopping_cart_recipe__user'],
+            ingredient_id=row['ingredient'],
+            amount=row['total'],
+        ) for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients_recipe', '0004_unique_ingredient'),
+        ('relations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shortlink',
+            name='id',
+            field=models.CharField(default=relations.models.six_string, editable=False, max_length=6, primary_key=True, serialize=False),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField()),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ingredients_recipe.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item')],
+            },
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
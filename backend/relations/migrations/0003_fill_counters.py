@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:37
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('ingredients_recipe', 'Recipe')
+    User = apps.get_model('custom_user', 'CustomUser')
+    Subscription = apps.get_model('custom_user', 'Subscription')
+    FavoriteUserRecipe = apps.get_model('relations', 'FavoriteUserRecipe')
+    ShoppingCartUserRecipe = apps.get_model('relations', 'ShoppingCartUserRecipe')
+    Recipe.objects.update(
+        favorites_count=count_of(FavoriteUserRecipe, 'recipe'),
+        in_carts_count=count_of(ShoppingCartUserRecipe, 'recipe'),
+    )
+    User.objects.update(
+        subscribers_count=count_of(Subscription, 'to'),
+        recipes_count=count_of(Recipe, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_user', '0002_counters'),
+        ('ingredients_recipe', '0005_recipe_counters'),
+        ('relations', '0002_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
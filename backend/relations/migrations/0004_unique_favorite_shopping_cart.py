@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), Value(0))
+
+
+def delete_duplicates(model):
+    duplicates = model.objects.values('user', 'recipe').order_by().annotate(
+        first=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    deleted = 0
+    for row in duplicates:
+        deleted += model.objects.filter(
+            user=row['user'], recipe=row['recipe']
+        ).exclude(id=row['first']).delete()[0]
+    return deleted
+
+
+def deduplicate(apps, schema_editor):
+    Recipe = apps.get_model('ingredients_recipe', 'Recipe')
+    RecipeIngredient = apps.get_model('ingredients_recipe', 'RecipeIngredient')
+    FavoriteUserRecipe = apps.get_model('relations', 'FavoriteUserRecipe')
+    ShoppingCartUserRecipe = apps.get_model('relations', 'ShoppingCartUserRecipe')
+    ShoppingListItem = apps.get_model('relations', 'ShoppingListItem')
+
+    if delete_duplicates(FavoriteUserRecipe):
+        Recipe.objects.update(favorites_count=count_of(FavoriteUserRecipe, 'recipe'))
+    if delete_duplicates(ShoppingCartUserRecipe):
+        Recipe.objects.update(in_carts_count=count_of(ShoppingCartUserRecipe, 'recipe'))
+        rows = RecipeIngredient.objects.filter(
+            recipe__shopping_cart_recipe__isnull=False
+        ).values_list(
+            'recipe__shopping_cart_recipe__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+        ShoppingListItem.objects.all().delete()
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id, amount=total)
+            for user_id, ingredient_id, total in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients_recipe', '0006_recipe_feed_idx'),
+        ('relations', '0003_fill_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favoriteuserrecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartuserrecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
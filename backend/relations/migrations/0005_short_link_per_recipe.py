@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def delete_duplicates(apps, schema_editor):
+    ShortLink = apps.get_model('relations', 'ShortLink')
+    duplicated = ShortLink.objects.values('recipe').order_by().annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('recipe', flat=True)
+    for recipe_id in list(duplicated):
+        keep = ShortLink.objects.filter(recipe_id=recipe_id).order_by('id').first()
+        ShortLink.objects.filter(recipe_id=recipe_id).exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients_recipe', '0006_recipe_feed_idx'),
+        ('relations', '0004_unique_favorite_shopping_cart'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='shortlink',
+            name='recipe',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='short_link', to='ingredients_recipe.recipe'),
+        ),
+    ]
@@ -4,7 +4,7 @@ import string
 from django.contrib.auth import get_user_model
 from django.db import models
 
-from ingredients_recipe.models import Recipe
+from ingredients_recipe.models import Ingredient, Recipe
 
 User = get_user_model()
 
@@ -13,11 +13,32 @@ class FavoriteUserRecipe(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='favorites')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'], name='unique_favorite')
+        ]
+
 
 class ShoppingCartUserRecipe(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_cart')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='shopping_cart_recipe')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'], name='unique_shopping_cart')
+        ]
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_list')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='+')
+    amount = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'], name='unique_shopping_list_item')
+        ]
+
 
 def six_string():
     return ''.join(random.choice(string.ascii_letters) for i in range(6))
@@ -25,4 +46,4 @@ def six_string():
 
 class ShortLink(models.Model):
     id = models.CharField(max_length=6, primary_key=True, default=six_string, editable=False)
-    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, related_name='short_link')
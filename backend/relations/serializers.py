@@ -1,9 +1,16 @@
 from ingredients_recipe.models import Recipe
+from main.images import SizedImageField
 from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
 from rest_framework import serializers
 
 
+# What ShortRecipeSerializer and the author prefetch read: never the snapshot or text.
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants', 'cooking_time', 'author', 'pub_date')
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image = SizedImageField(size='list')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -0,0 +1,144 @@
+import csv
+from html import escape
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from ingredients_recipe.models import RecipeIngredient
+from relations.models import ShoppingCartUserRecipe, ShoppingListItem
+
+TITLE = 'Список покупок'
+
+
+def get_ingredients(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        total_amount=F('amount')
+    ).order_by('ingredient__name')
+
+
+def get_recipe_amounts(recipe):
+    return dict(recipe.recipe_ingredients.values_list('ingredient_id', 'amount'))
+
+
+@transaction.atomic
+def apply_deltas(user_ids, deltas):
+    """Add ``deltas`` ({ingredient_id: amount}) to the shopping lists of ``user_ids``."""
+    deltas = {ingredient_id: delta for ingredient_id, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    created, updated, deleted = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    created.append(ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id, amount=delta
+                    ))
+                continue
+            item.amount += delta
+            if item.amount > 0:
+                updated.append(item)
+            else:
+                deleted.append(item.pk)
+    ShoppingListItem.objects.bulk_create(created)
+    ShoppingListItem.objects.bulk_update(updated, ['amount'])
+    ShoppingListItem.objects.filter(pk__in=deleted).delete()
+
+
+def add_recipe(user, recipe):
+    apply_deltas([user.pk], get_recipe_amounts(recipe))
+
+
+def remove_recipe(user, recipe):
+    amounts = get_recipe_amounts(recipe)
+    apply_deltas([user.pk], {pk: -amount for pk, amount in amounts.items()})
+
+
+def change_recipe(recipe, old_amounts):
+    """Propagate an edit of ``recipe`` ingredients to every cart holding it."""
+    new_amounts = get_recipe_amounts(recipe)
+    deltas = {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in old_amounts.keys() | new_amounts.keys()
+    }
+    apply_deltas(recipe.shopping_cart_recipe.values_list('user_id', flat=True), deltas)
+
+
+def compute_shopping_lists():
+    """Aggregate every cart from scratch as {(user_id, ingredient_id): amount}."""
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).values_list(
+        'recipe__shopping_cart_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {(user_id, ingredient_id): total for user_id, ingredient_id, total in rows}
+
+
+def get_recipe_names(user):
+    return ShoppingCartUserRecipe.objects.filter(
+        user=user
+    ).values_list(
+        'recipe__name', flat=True
+    )
+
+
+def stream_text(user):
+    yield f'{TITLE}\n\n'
+    for number, row in enumerate(get_ingredients(user).iterator(), start=1):
+        yield (f'{number}. {row["ingredient__name"]} '
+               f'({row["ingredient__measurement_unit"]}) — {row["total_amount"]}\n')
+    yield '\nРецепты:\n'
+    for name in get_recipe_names(user).iterator():
+        yield f'- {name}\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(user):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['name', 'measurement_unit', 'amount'])
+    for row in get_ingredients(user).iterator():
+        yield writer.writerow([
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['total_amount'],
+        ])
+
+
+def stream_html(user):
+    yield (
+        '<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+        f'<title>{TITLE}</title>\n'
+        '<style>body{font-family:sans-serif}td{padding:2px 12px}'
+        '@media print{button{display:none}}</style>\n'
+        f'</head>\n<body>\n<h1>{TITLE}</h1>\n<table>\n'
+    )
+    for row in get_ingredients(user).iterator():
+        yield (f'<tr><td>&#9744; {escape(row["ingredient__name"])}</td>'
+               f'<td>{row["total_amount"]} {escape(row["ingredient__measurement_unit"])}</td></tr>\n')
+    yield '</table>\n<h2>Рецепты</h2>\n<ul>\n'
+    for name in get_recipe_names(user).iterator():
+        yield f'<li>{escape(name)}</li>\n'
+    yield '</ul>\n<button onclick="window.print()">Печать</button>\n</body>\n</html>\n'
+
+
+EXPORTS = {
+    'txt': (stream_text, 'text/plain; charset=utf-8'),
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'html': (stream_html, 'text/html; charset=utf-8'),
+}
@@ -0,0 +1,86 @@
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from relations.models import ShortLink, six_string
+
+ALPHABET = string.digits + string.ascii_letters
+MAX_ATTEMPTS = 10
+
+
+def base62(number):
+    code = ''
+    while True:
+        number, remainder = divmod(number, len(ALPHABET))
+        code = ALPHABET[remainder] + code
+        if not number:
+            return code
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ``ttl`` seconds after insertion."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+cache = TTLCache(settings.SHORT_LINK_CACHE_SIZE, settings.SHORT_LINK_CACHE_TTL)
+
+
+def get_or_create_code(recipe_id):
+    """Return the recipe's short code, creating it on first request."""
+    existing = ShortLink.objects.filter(recipe_id=recipe_id).values_list('id', flat=True).first()
+    if existing:
+        return existing
+    candidates = [base62(recipe_id)] + [six_string() for _ in range(MAX_ATTEMPTS)]
+    for code in candidates:
+        try:
+            with transaction.atomic():
+                ShortLink.objects.create(id=code, recipe_id=recipe_id)
+        except IntegrityError:
+            existing = ShortLink.objects.filter(recipe_id=recipe_id).values_list('id', flat=True).first()
+            if existing:
+                return existing
+            continue
+        cache.set(code, recipe_id)
+        return code
+    raise IntegrityError(f'Could not allocate a short link for recipe {recipe_id}')
+
+
+def resolve(code):
+    recipe_id = cache.get(code)
+    if recipe_id is None:
+        recipe_id = ShortLink.objects.filter(pk=code).values_list('recipe_id', flat=True).first()
+        if recipe_id is not None:
+            cache.set(code, recipe_id)
+    return recipe_id
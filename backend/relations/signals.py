@@ -0,0 +1,14 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from ingredients_recipe.models import Recipe
+from relations.shopping_list import apply_deltas, get_recipe_amounts
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    amounts = get_recipe_amounts(instance)
+    apply_deltas(
+        instance.shopping_cart_recipe.values_list('user_id', flat=True),
+        {pk: -amount for pk, amount in amounts.items()}
+    )
@@ -1,3 +1,403 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from custom_user import async_views as user_async_views
+from custom_user.models import Subscription
+from ingredients_recipe.models import Ingredient, Recipe
+from main.response_cache import get_stats, reset_stats
+from main.testing import create_ingredients, create_recipes, create_user, recipe_data, token_header
+from relations import async_views
+from relations.management.commands import bench_api
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe, ShoppingListItem, ShortLink
+from relations.short_links import base62, cache as short_link_cache
+from relations.shopping_list import compute_shopping_lists
+
+User = get_user_model()
+
+
+class DownloadShoppingCartTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('buyer')
+        author = create_user('author')
+        self.ingredients = create_ingredients(20)
+        self.recipes = create_recipes(author, 3, self.ingredients)
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+        for recipe in self.recipes:
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def _download(self, **params):
+        response = self.client.get('/api/recipes/download_shopping_cart/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_text_is_default_and_streamed_incrementally(self):
+        response = self._download()
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            next(chunks)
+        rest = list(chunks)
+
+        self.assertGreater(len(rest), len(self.ingredients))
+        self.assertIn('ingredient 00 (g) — 15', b''.join(rest).decode())
+
+    def test_csv_and_html_formats(self):
+        csv_body = b''.join(self._download(format='csv').streaming_content).decode()
+        self.assertEqual(csv_body.splitlines()[1], 'ingredient 00,g,15')
+
+        html = self._download(format='html')
+        self.assertIn('attachment; filename="shopping_list.html"', html['Content-Disposition'])
+        self.assertIn('<td>15 g</td>', b''.join(html.streaming_content).decode())
+
+    def test_json_format_is_kept(self):
+        response = self._download(format='json')
+        self.assertEqual(len(response.data['ingredients']), len(self.ingredients))
+        self.assertEqual(len(response.data['recipes']), 3)
+
+    def _stored(self):
+        return dict(ShoppingListItem.objects.filter(user=self.user).values_list(
+            'ingredient_id', 'amount'
+        ))
+
+    def _assert_consistent(self):
+        self.assertEqual(
+            {(self.user.id, pk): amount for pk, amount in self._stored().items()},
+            {key: value for key, value in compute_shopping_lists().items()
+             if key[0] == self.user.id}
+        )
+
+    def test_list_is_maintained_incrementally(self):
+        self.assertEqual(set(self._stored().values()), {15})
+
+        self.client.delete(f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        self.assertEqual(set(self._stored().values()), {10})
+
+        self.recipes[1].delete()
+        self.assertEqual(set(self._stored().values()), {5})
+        self._assert_consistent()
+
+        self.client.delete(f'/api/recipes/{self.recipes[2].id}/shopping_cart/')
+        self.assertEqual(self._stored(), {})
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_recipe_edit_updates_carts(self):
+        recipe = self.recipes[0]
+        recipe.author = self.user
+        recipe.save()
+
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', recipe_data(
+            [(self.ingredients[0].id, 1), (self.ingredients[1].id, 20)], name='Updated'
+        ), format='json')
+
+        self.assertEqual(response.status_code, 200)
+        stored = self._stored()
+        self.assertEqual(stored[self.ingredients[0].id], 11)
+        self.assertEqual(stored[self.ingredients[1].id], 30)
+        self.assertEqual(stored[self.ingredients[2].id], 10)
+        self._assert_consistent()
+
+    def test_rebuild_command_fixes_drift(self):
+        ShoppingListItem.objects.filter(ingredient=self.ingredients[0]).update(amount=1)
+        ShoppingListItem.objects.filter(ingredient=self.ingredients[1]).delete()
+
+        out = io.StringIO()
+        call_command('rebuild_shopping_lists', '--dry-run', stdout=out)
+        self.assertIn('2 drifted rows', out.getvalue())
+        self.assertEqual(self._stored()[self.ingredients[0].id], 1)
+
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        self._assert_consistent()
+
+    def test_anonymous_is_rejected(self):
+        self.client.credentials()
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 401)
+
+
+class CountersTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.author = create_user('author')
+        self.recipe = create_recipes(self.author, 1)[0]
+        self.client.credentials(HTTP_AUTHORIZATION=token_header(self.user))
+
+    def _counters(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        return (self.recipe.favorites_count, self.recipe.in_carts_count,
+                self.author.subscribers_count, self.author.recipes_count)
+
+    def test_toggles_update_counters(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.data['subscribers_count'], 1)
+        self.assertEqual(self._counters(), (1, 1, 1, 1))
+
+        detail = self.client.get(f'/api/recipes/{self.recipe.id}/').data
+        self.assertEqual((detail['favorites_count'], detail['in_carts_count']), (1, 1))
+
+        self.client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.delete(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(self._counters(), (0, 0, 0, 1))
+
+    def test_toggles_skip_snapshots(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+            self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+            async_to_sync(async_views.favorite)(
+                RequestFactory().delete('/', HTTP_AUTHORIZATION=token_header(self.user)), pk=self.recipe.id
+            )
+
+        self.assertEqual(self._counters()[:2], (0, 1))
+        self.assertFalse([q for q in context.captured_queries if '"snapshot"' in q['sql']])
+
+    def test_reconcile_command(self):
+        FavoriteUserRecipe.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(from_source=self.user, to=self.author)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=7)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+
+        self.assertIn('ingredients_recipe.Recipe.favorites_count: 1 rows fixed', out.getvalue())
+        self.assertEqual(self._counters(), (1, 0, 1, 1))
+
+
+class ConcurrentTogglesTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.recipe = create_recipes(create_user('author'), 1)[0]
+        self.token = token_header(self.user)
+
+    def _post_concurrently(self, url, threads=8):
+        barrier = threading.Barrier(threads)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=self.token)
+            barrier.wait()
+            try:
+                statuses.append(client.post(url).status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=post) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sorted(statuses)
+
+    def test_concurrent_favorite_clicks_create_one_row(self):
+        statuses = self._post_concurrently(f'/api/recipes/{self.recipe.id}/favorite/')
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(set(statuses) - {201}, {400})
+        self.assertEqual(FavoriteUserRecipe.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_concurrent_cart_clicks_create_one_row(self):
+        statuses = self._post_concurrently(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(ShoppingCartUserRecipe.objects.count(), 1)
+
+
+class ShortLinkTest(APITestCase):
+
+    def setUp(self):
+        self.recipes = create_recipes(create_user('author'), 2)
+        short_link_cache.clear()
+
+    def _code(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.id}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['short-link'].rstrip('/').rsplit('/', 1)[-1]
+
+    def test_link_is_idempotent_and_resolves(self):
+        code = self._code(self.recipes[0])
+        self.assertEqual(self._code(self.recipes[0]), code)
+        self.assertEqual(ShortLink.objects.count(), 1)
+
+        short_link_cache.clear()
+        response = self.client.get(f'/s/{code}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'/recipes/{self.recipes[0].id}')
+        with self.assertNumQueries(0):
+            self.client.get(f'/s/{code}/')
+
+    def test_code_collision_is_retried(self):
+        ShortLink.objects.create(id=base62(self.recipes[1].id), recipe=self.recipes[0])
+
+        code = self._code(self.recipes[1])
+
+        self.assertNotEqual(code, base62(self.recipes[1].id))
+        self.assertEqual(ShortLink.objects.get(pk=code).recipe, self.recipes[1])
+
+    def test_unknown_code_and_recipe(self):
+        self.assertEqual(self.client.get('/s/nope/').status_code, 404)
+        self.assertEqual(self.client.get('/api/recipes/999999/get-link/').status_code, 404)
+
+
+class AsyncTogglesTest(APITestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.recipe = create_recipes(
+            self.author, 1, [Ingredient.objects.create(name='соль', measurement_unit='г')]
+        )[0]
+        self.factory = RequestFactory()
+
+    def _sync(self, token, method, path, view, **kwargs):
+        response = getattr(self.client, method)(path, HTTP_AUTHORIZATION=token)
+        return response.status_code, response.content, response.get('WWW-Authenticate')
+
+    def _async(self, token, method, path, view, **kwargs):
+        request = getattr(self.factory, method)(path, HTTP_AUTHORIZATION=token)
+        response = async_to_sync(view)(request, **kwargs)
+        return response.status_code, response.content, response.get('WWW-Authenticate')
+
+    def _scenario(self, call, username):
+        token = token_header(create_user(username))
+        recipe, author = self.recipe.id, self.author.id
+        steps = []
+        for name, view, key, path in (
+            ('favorite', async_views.favorite, 'pk', f'/api/recipes/{recipe}/favorite/'),
+            ('shopping_cart', async_views.shopping_cart, 'pk', f'/api/recipes/{recipe}/shopping_cart/'),
+            ('subscribe', user_async_views.subscribe, 'id', f'/api/users/{author}/subscribe/'),
+        ):
+            target = author if name == 'subscribe' else recipe
+            for method in ('post', 'post', 'delete', 'delete'):
+                steps.append(call(token, method, path + '?recipes_limit=1', view, **{key: target}))
+            missing = path.replace(f'/{target}/', '/0/')
+            steps.append(call(token, 'post', missing, view, **{key: 0}))
+            steps.append(call('', 'post', path, view, **{key: target}))
+            steps.append(call('Token nope', 'delete', path, view, **{key: target}))
+            steps.append(call(token, 'get', path, view, **{key: target}))
+        return steps
+
+    def test_same_responses_as_sync_views(self):
+        expected = self._scenario(self._sync, 'sync')
+        actual = self._scenario(self._async, 'async')
+
+        self.assertEqual(actual, expected)
+        self.assertEqual(
+            [step[0] for step in actual[:8]], [201, 400, 204, 400, 404, 401, 401, 405]
+        )
+
+    def test_toggles_keep_counters_and_shopping_list(self):
+        user = create_user('reader')
+        token = token_header(user)
+        recipe_path = f'/api/recipes/{self.recipe.id}/'
+
+        self._async(token, 'post', recipe_path + 'favorite/', async_views.favorite, pk=self.recipe.id)
+        self._async(token, 'post', recipe_path + 'shopping_cart/', async_views.shopping_cart, pk=self.recipe.id)
+        status, content, _ = self._async(
+            token, 'post', f'/api/users/{self.author.id}/subscribe/', user_async_views.subscribe, id=self.author.id
+        )
+
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(content)['subscribers_count'], 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.favorites_count, self.recipe.in_carts_count), (1, 1))
+        self.assertEqual(list(ShoppingListItem.objects.values_list('user', 'amount')), [(user.id, 5)])
+
+        self._async(token, 'delete', recipe_path + 'shopping_cart/', async_views.shopping_cart, pk=self.recipe.id)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_failed_toggle_writes_nothing(self):
+        token = token_header(create_user('reader'))
+        path = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+
+        with mock.patch('relations.async_views.add_recipe', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self._async(token, 'post', path, async_views.shopping_cart, pk=self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
+        self.assertFalse(ShoppingCartUserRecipe.objects.exists())
+        self.assertEqual(self._async(token, 'post', path, async_views.shopping_cart, pk=self.recipe.id)[0], 201)
+
+
+class SeedDataTest(APITestCase):
+
+    def setUp(self):
+        create_ingredients(30, 'г')
+
+    def _seed(self, *args):
+        call_command('seed_data', '--users', '25', '--recipes', '40', *args, stdout=io.StringIO())
+
+    def _shape(self):
+        return sorted(Recipe.objects.filter(
+            author__username__startswith='seed-'
+        ).values_list('name', 'favorites_count', 'in_carts_count', 'author__username'))
+
+    def test_seed_is_reproducible_and_consistent(self):
+        self._seed()
+        shape = self._shape()
+        self._seed()
+
+        self.assertEqual(self._shape(), shape)
+        self.assertEqual(User.objects.filter(username__startswith='seed-').count(), 25)
+        self.assertGreater(FavoriteUserRecipe.objects.count(), 0)
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        call_command('rebuild_shopping_lists', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().count(': 0 rows fixed'), 4)
+        self.assertIn('0 drifted rows', out.getvalue())
+
+        self._seed('--clear')
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bench_api_reports_every_scenario(self):
+        self._seed()
+        reset_stats()
+        out = io.StringIO()
+        call_command('bench_api', '--requests', '3', '--warmup', '0', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['run']['transport'], 'test client')
+        self.assertEqual(get_stats(), {'hits': 0, 'misses': 0})
+        self.assertEqual(set(report['scenarios']), {
+            'feed', 'feed_by_author', 'feed_favorited', 'feed_in_cart',
+            'subscriptions', 'shopping_list', 'toggles', 'autocomplete',
+        })
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreaterEqual(result['queries']['max'], 0)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['max'])
+        self.assertEqual(FavoriteUserRecipe.objects.count(), report['run']['data']['favorites'])
+
+    def test_bench_api_deletes_its_tokens(self):
+        self._seed()
+        kept = Token.objects.filter(user__favorites__isnull=False).first()
+        Token.objects.exclude(pk=kept.pk).delete()
+        transport = mock.patch.object(bench_api, 'HttpTransport', lambda url, tokens: bench_api.ClientTransport(tokens))
+        with transport:
+            call_command('bench_api', '--url', 'http://server', '--scenario', 'feed_favorited',
+                         '--requests', '3', '--warmup', '0', stdout=io.StringIO())
+
+        self.assertEqual(list(Token.objects.all()), [kept])
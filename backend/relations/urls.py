@@ -1,10 +1,15 @@
-from relations.views import generate_short_link, favorite, redirect_short_link, shopping_cart, download_shopping_cart
+from django.conf import settings
 from django.urls import path
 
+from relations import async_views, views
+from relations.views import generate_short_link, redirect_short_link, download_shopping_cart
+
+toggles = async_views if settings.ASYNC_TOGGLES else views
+
 urlpatterns = [
     path('api/recipes/<int:pk>/get-link/', generate_short_link),
-    path('api/recipes/<int:pk>/shopping_cart/', shopping_cart),
-    path('api/recipes/<int:pk>/favorite/', favorite),
+    path('api/recipes/<int:pk>/shopping_cart/', toggles.shopping_cart),
+    path('api/recipes/<int:pk>/favorite/', toggles.favorite),
     path('api/recipes/download_shopping_cart/', download_shopping_cart),
     path('s/<str:pk>/', redirect_short_link, name='short-link')
 ]
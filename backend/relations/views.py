@@ -1,98 +1,118 @@
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework import status
-from rest_framework.decorators import api_view
-from ingredients_recipe.models import Recipe, RecipeIngredient
-from relations.models import ShortLink, FavoriteUserRecipe, ShoppingCartUserRecipe
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from ingredients_recipe.models import Recipe
+from relations.models import FavoriteUserRecipe, ShoppingCartUserRecipe
 from rest_framework.response import Response
-from django.db.models import Sum
 
-from relations.serializers import ShortRecipeSerializer
+from relations.counters import increment
+from relations.renderers import CSVRenderer, HTMLRenderer, TextRenderer
+from relations.serializers import SHORT_RECIPE_FIELDS, ShortRecipeSerializer
+from relations.short_links import get_or_create_code, resolve
+from relations.shopping_list import EXPORTS, add_recipe, get_ingredients, get_recipe_names, remove_recipe
 
 
 @api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def redirect_short_link(request, pk):
-    try:
-        link_obj = ShortLink.objects.select_related('recipe').get(recipe_id=pk)
-        return redirect('recipes-detail', pk=link_obj.id)
-    except Exception:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    recipe_id = resolve(pk)
+    if recipe_id is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return redirect(f'/recipes/{recipe_id}')
 
 
 @api_view(['GET'])
 def generate_short_link(request, pk=None):
-    link = ShortLink(recipe_id=pk)
-    link.save()
-    return Response({'short-link': reverse('short-link', kwargs={'pk': link.id})})
+    get_object_or_404(Recipe.objects.only('id'), pk=pk)
+    code = get_or_create_code(pk)
+    return Response({'short-link': request.build_absolute_uri(reverse('short-link', kwargs={'pk': code}))})
+
+
+def add_relation(model, user, recipe, counter, added=None):
+    """Create the row and update ``counter`` and ``added`` atomically; False if it exists."""
+    try:
+        with transaction.atomic():
+            model.objects.create(user=user, recipe=recipe)
+            increment(Recipe, recipe.pk, counter)
+            if added:
+                added(user, recipe)
+    except IntegrityError:
+        return False
+    return True
+
+
+def remove_relation(model, user, recipe, counter, removed=None):
+    """Delete the row and update ``counter`` and ``removed`` atomically; return the rows deleted."""
+    with transaction.atomic():
+        deleted = model.objects.filter(user=user, recipe=recipe).delete()[0]
+        if deleted:
+            increment(Recipe, recipe.pk, counter, -deleted)
+            if removed:
+                removed(user, recipe)
+    return deleted
 
 
 @api_view(['post', 'delete'])
 def favorite(request, pk=None):
-    recipe = get_object_or_404(Recipe, pk=pk)
+    recipe = get_object_or_404(Recipe.objects.only(*SHORT_RECIPE_FIELDS), pk=pk)
     user = request.user
 
     if not user.is_authenticated:
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     if request.method == 'POST':
-        _, created = FavoriteUserRecipe.objects.get_or_create(user=user, recipe=recipe)
-        if not created:
+        if not add_relation(FavoriteUserRecipe, user, recipe, 'favorites_count'):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         serializer = ShortRecipeSerializer(recipe, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     else:  # DELETE
-        deleted = user.favorites.filter(recipe=recipe).delete()[0]
-        if not deleted:
+        if not remove_relation(FavoriteUserRecipe, user, recipe, 'favorites_count'):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['post', 'delete'])
 def shopping_cart(request, pk=None):
-    recipe = get_object_or_404(Recipe, pk=pk)
+    recipe = get_object_or_404(Recipe.objects.only(*SHORT_RECIPE_FIELDS), pk=pk)
     user = request.user
 
     if not user.is_authenticated:
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     if request.method == 'POST':
-        _, created = ShoppingCartUserRecipe.objects.get_or_create(user=user, recipe=recipe)
-        if not created:
+        if not add_relation(ShoppingCartUserRecipe, user, recipe, 'in_carts_count', added=add_recipe):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         serializer = ShortRecipeSerializer(recipe, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     else:
-        deleted = user.shopping_cart.filter(recipe=recipe).delete()[0]
-        if not deleted:
+        if not remove_relation(ShoppingCartUserRecipe, user, recipe, 'in_carts_count', removed=remove_recipe):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['get'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([TextRenderer, CSVRenderer, HTMLRenderer, JSONRenderer])
 def download_shopping_cart(request):
     user = request.user
-
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping_cart_recipe__user=user
-    ).values(
-        'ingredient__name',
-        'ingredient__measurement_unit'
-    ).annotate(
-        total_amount=Sum('amount')
-    ).order_by('ingredient__name')
-
-    recipes = ShoppingCartUserRecipe.objects.filter(
-        user=user
-    ).values_list(
-        'recipe__name', flat=True
-    )
-
-    data = {
-        'ingredients': list(ingredients),
-        'recipes': list(recipes),
-        'message': 'Shopping list generated successfully'
-    }
-
-    return Response(data)
+    file_format = request.accepted_renderer.format
+
+    if file_format == 'json':
+        return Response({
+            'ingredients': list(get_ingredients(user)),
+            'recipes': list(get_recipe_names(user)),
+            'message': 'Shopping list generated successfully'
+        })
+
+    stream, content_type = EXPORTS[file_format]
+    response = StreamingHttpResponse(stream(user), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="shopping_list.{file_format}"'
+    return response
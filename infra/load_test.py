@@ -0,0 +1,76 @@
+"""Closed-loop HTTP load test for the Foodgram API (standard library only).
+
+    python infra/load_test.py http://localhost:8000 --concurrency 16 --duration 20
+
+Each worker thread keeps one connection and requests the paths in turn;
+the run reports throughput and latency percentiles.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+DEFAULT_PATHS = ['/api/recipes/', '/api/recipes/?limit=6&page=2', '/api/ingredients/?name=са']
+
+
+def worker(base, paths, deadline, timings, errors, lock):
+    url = urlsplit(base)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(url.netloc, timeout=30)
+    local, failed, index = [], 0, 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                failed += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            connection.close()
+        local.append(time.perf_counter() - started)
+    with lock:
+        timings.extend(local)
+        errors.append(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base', help='Server root, e.g. http://localhost:8000')
+    parser.add_argument('--path', action='append', dest='paths', help='Path to request, repeatable.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    options = parser.parse_args()
+
+    paths = [quote(path, safe='/?=&') for path in options.paths or DEFAULT_PATHS]
+    timings, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + options.duration
+    threads = [
+        threading.Thread(target=worker, args=(options.base, paths, deadline, timings, errors, lock))
+        for _ in range(options.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not timings:
+        raise SystemExit('No request completed.')
+    timings.sort()
+    quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    print(f'{len(timings)} requests, {sum(errors)} errors in {options.duration:.0f}s '
+          f'with {options.concurrency} connections')
+    print(f'throughput: {len(timings) / options.duration:.1f} req/s')
+    print(f'latency: p50 {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, '
+          f'p99 {quantiles[98] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()